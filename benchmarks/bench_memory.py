@@ -0,0 +1,89 @@
+"""Memory benchmarks for the saved results.
+Run explicitly with the plugin loaded, e.g.:
+    pytest -s benchmarks/bench_memory.py
+Each measurement runs in a child process so the peak RSS of one does
+not hide the other.
+"""
+import multiprocessing
+import resource
+from pytest import log, verify
+from pytest_verify.pytest_verify import (
+    CONFIG,
+    ColumnarResultStore,
+    Result,
+    ResultStore,
+    Verifications
+)
+
+RESULTS = 1000000
+# Number of saved failures and size (bytes) of the local variable
+# referenced by each.
+HEAVY_FAILURES = 50
+HEAVY_LOCAL_SIZE = 4 * 1024 * 1024
+
+
+def _saved_results_rss(store_class, queue):
+    # Save RESULTS passing results to a new store and report the
+    # increase in peak RSS (kB).
+    rss_start = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    store = store_class()
+    for i in xrange(RESULTS):
+        store.add_result(Result("passing verification", "PASS", "P",
+                                "function", "fixture", None, None, True,
+                                source_location=(__file__, i % 100,
+                                                 "_saved_results_rss")))
+    queue.put(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_start)
+
+
+def _heavy_failure():
+    capture = bytearray(HEAVY_LOCAL_SIZE)
+    verify(not capture, "Capture is empty (fails)", raise_immediately=False)
+
+
+def _saved_heavy_failures_rss(release_frames, queue):
+    # Save HEAVY_FAILURES failures that each reference a large local
+    # variable and report the increase in peak RSS (kB).
+    CONFIG["release-traceback-frames"].value = release_frames
+    # Keep the failures in the child rather than passing them to the
+    # session (which would raise them)
+    Verifications.store = ResultStore()
+    rss_start = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    for i in xrange(HEAVY_FAILURES):
+        _heavy_failure()
+    queue.put(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_start)
+
+
+def _measure(target, *args):
+    queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=target, args=args + (queue,))
+    process.start()
+    rss = queue.get()
+    process.join()
+    return rss
+
+
+def test_bench_saved_results_memory():
+    log.high_level_step("Benchmark memory used by {} saved results"
+                        .format(RESULTS))
+    object_rss = _measure(_saved_results_rss, ResultStore)
+    log.detail_step("Result objects: {:.1f}MB ({:.0f} bytes per result)"
+                    .format(object_rss / 1024.0,
+                            object_rss * 1024.0 / RESULTS))
+    columnar_rss = _measure(_saved_results_rss, ColumnarResultStore)
+    log.detail_step("Result columns: {:.1f}MB ({:.0f} bytes per result)"
+                    .format(columnar_rss / 1024.0,
+                            columnar_rss * 1024.0 / RESULTS))
+    verify(columnar_rss < object_rss, "Columnar results use less memory than "
+                                      "result objects")
+
+
+def test_bench_heavy_locals_memory():
+    log.high_level_step("Benchmark memory used by {} saved failures "
+                        "referencing {}MB local variables"
+                        .format(HEAVY_FAILURES, HEAVY_LOCAL_SIZE / 1024**2))
+    retained_rss = _measure(_saved_heavy_failures_rss, False)
+    log.detail_step("Frames retained: {:.1f}MB".format(retained_rss / 1024.0))
+    released_rss = _measure(_saved_heavy_failures_rss, True)
+    log.detail_step("Frames released: {:.1f}MB".format(released_rss / 1024.0))
+    verify(released_rss < retained_rss, "Releasing traceback frames reduces "
+                                        "the peak RSS")
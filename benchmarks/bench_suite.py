@@ -0,0 +1,373 @@
+"""Plugin overhead benchmark suite.
+Generates test modules (like those in test_env) in a temporary directory,
+runs each session with pytest in a child process and reports:
+- verify pass/fail/warn throughput (ops/sec) and per call latency
+  percentiles,
+- the overhead of the hook wrappers of each test phase (setup, call and
+  teardown) per test,
+- the pytest_terminal_summary time and the session duration,
+- the peak memory (RSS) of each session,
+- the plugin import time and the pytest --collect-only startup time with
+  and without the plugin.
+Run from the repository root, e.g.:
+    python benchmarks/bench_suite.py --scale quick
+    python benchmarks/bench_suite.py --save-baseline benchmarks/baseline.json
+    python benchmarks/bench_suite.py --baseline benchmarks/baseline.json
+Compared with a baseline the suite exits with status 1 if any result is
+worse than the baseline by more than the tolerance.
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import timeit
+
+# Verify calls of each type (pass/fail/warn) and number of tests of the
+# generated sessions for each scale.
+SCALES = {"quick": {"verifications": {"pass": 100000, "fail": 10000,
+                                      "warn": 10000},
+                    "tests": (1000,)},
+          "full": {"verifications": {"pass": 1000000, "fail": 100000,
+                                     "warn": 100000},
+                   "tests": (1000, 10000, 100000)}}
+# Tests per generated test module
+TESTS_PER_MODULE = 500
+# Verify calls per generated test (the fixture setup and teardown each
+# make one more).
+VERIFICATIONS_PER_TEST = 10
+# Default fraction a result may be worse than its baseline
+TOLERANCE = 0.25
+# Suffixes of the results where larger values are better (otherwise
+# smaller values are better).
+HIGHER_IS_BETTER = ("ops_per_sec", "tests_per_sec")
+
+# Timing plugin for the generated sessions. The phase hooks are wrapped
+# by an outermost and an innermost hook wrapper, the difference between
+# the two is the overhead of the other hook wrappers (the plugin's).
+CONFTEST = '''
+import json
+import os
+import resource
+import timeit
+from array import array
+import pytest
+
+_timer = timeit.default_timer
+# phase: (outer durations, inner durations)
+_PHASES = {}
+# verify type: latencies
+_LATENCIES = {}
+_SUMMARY = []
+
+
+def _record(phase, index, start):
+    _PHASES.setdefault(phase, (array("d"), array("d")))[index].append(
+        _timer() - start)
+
+
+def _percentiles(values):
+    values = sorted(values)
+    if not values:
+        return {}
+    return dict(("p{}_us".format(p),
+                 values[min(len(values) - 1, len(values) * p // 100)] * 1e6)
+                for p in (50, 90, 99, 100))
+
+
+class _OuterTimer(object):
+    @pytest.hookimpl(hookwrapper=True, tryfirst=True)
+    def pytest_runtest_setup(self, item):
+        start = _timer()
+        yield
+        _record("setup", 0, start)
+
+    @pytest.hookimpl(hookwrapper=True, tryfirst=True)
+    def pytest_pyfunc_call(self, pyfuncitem):
+        start = _timer()
+        yield
+        _record("call", 0, start)
+
+    @pytest.hookimpl(hookwrapper=True, tryfirst=True)
+    def pytest_runtest_teardown(self, item, nextitem):
+        start = _timer()
+        yield
+        _record("teardown", 0, start)
+
+    @pytest.hookimpl(hookwrapper=True, tryfirst=True)
+    def pytest_terminal_summary(self, terminalreporter):
+        start = _timer()
+        yield
+        _SUMMARY.append(_timer() - start)
+
+
+class _InnerTimer(object):
+    @pytest.hookimpl(hookwrapper=True, trylast=True)
+    def pytest_runtest_setup(self, item):
+        start = _timer()
+        yield
+        _record("setup", 1, start)
+
+    @pytest.hookimpl(hookwrapper=True, trylast=True)
+    def pytest_pyfunc_call(self, pyfuncitem):
+        start = _timer()
+        yield
+        _record("call", 1, start)
+
+    @pytest.hookimpl(hookwrapper=True, trylast=True)
+    def pytest_runtest_teardown(self, item, nextitem):
+        start = _timer()
+        yield
+        _record("teardown", 1, start)
+
+
+def pytest_configure(config):
+    config.pluginmanager.register(_OuterTimer(), "bench_outer_timer")
+    config.pluginmanager.register(_InnerTimer(), "bench_inner_timer")
+
+
+@pytest.fixture
+def bench_latencies():
+    def latencies(verify_type):
+        return _LATENCIES.setdefault(verify_type, array("d"))
+    return latencies
+
+
+def pytest_unconfigure(config):
+    results = {"peak_rss_kb":
+               resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               "terminal_summary_s": sum(_SUMMARY)}
+    for phase, (outer, inner) in _PHASES.items():
+        for key, value in _percentiles(
+                [o - i for o, i in zip(outer, inner)]).items():
+            results["{}_overhead_{}".format(phase, key)] = value
+    for verify_type, latencies in _LATENCIES.items():
+        results["verify_{}_ops_per_sec".format(verify_type)] = \\
+            len(latencies) / sum(latencies)
+        for key, value in _percentiles(latencies).items():
+            results["verify_{}_{}".format(verify_type, key)] = value
+    with open(os.environ["BENCH_RESULTS"], "w") as results_file:
+        json.dump(results, results_file)
+'''
+
+# Verify call of each type measured by the throughput session
+VERIFY_CALLS = {
+    "pass": 'verify(True, "passing verification")',
+    "fail": 'verify(False, "failing verification", raise_immediately=False)',
+    "warn": 'verify(True, "verification", warn_condition=False, '
+            'warn_message="warning verification")'
+}
+
+THROUGHPUT_TEST = '''
+
+def test_verify_{verify_type}(bench_latencies):
+    latencies = bench_latencies("{verify_type}")
+    timer = timeit.default_timer
+    for i in xrange({count}):
+        start = timer()
+        {verify_call}
+        latencies.append(timer() - start)
+'''
+
+SESSION_MODULE = '''import pytest
+from pytest import verify
+
+
+@pytest.fixture
+def device(request):
+    verify(True, "device is ready")
+
+    def release():
+        verify(True, "device is released")
+    request.addfinalizer(release)
+    return 1
+'''
+
+SESSION_TEST = '''
+
+def test_{index}(device):
+    for i in range({count}):
+        verify(device == 1, "device value {{}} is 1", fail_args=(i,))
+'''
+
+# Test that saves a warning (every WARNING_TEST_INTERVAL tests)
+SESSION_WARNING_TEST = '''
+
+def test_{index}(device):
+    verify(device == 1, "device value is 1", warn_condition=device > 1,
+           warn_message="device value is greater than 1")
+'''
+WARNING_TEST_INTERVAL = 100
+# Runs of each startup measurement (the median is reported)
+STARTUP_RUNS = 5
+# Prints the time to import the plugin (pytest already imported)
+IMPORT_TIME_SCRIPT = ("import pytest, timeit; start = timeit.default_timer(); "
+                      "import pytest_verify.pytest_verify; "
+                      "print(timeit.default_timer() - start)")
+
+
+def _write(path, text):
+    with open(path, "w") as output_file:
+        output_file.write(text)
+
+
+def _generate_throughput_session(directory, verifications):
+    # One test for each verify type that times each call
+    tests = ["import timeit\nfrom pytest import verify\n"]
+    for verify_type in sorted(verifications):
+        tests.append(THROUGHPUT_TEST.format(
+            verify_type=verify_type, count=verifications[verify_type],
+            verify_call=VERIFY_CALLS[verify_type]))
+    _write(os.path.join(directory, "test_throughput.py"), "".join(tests))
+
+
+def _generate_session(directory, tests):
+    for module_index in range(0, tests, TESTS_PER_MODULE):
+        module = [SESSION_MODULE]
+        for index in range(module_index,
+                           min(module_index + TESTS_PER_MODULE, tests)):
+            if index % WARNING_TEST_INTERVAL == WARNING_TEST_INTERVAL - 1:
+                module.append(SESSION_WARNING_TEST.format(index=index))
+            else:
+                module.append(SESSION_TEST.format(
+                    index=index, count=VERIFICATIONS_PER_TEST))
+        _write(os.path.join(directory, "test_session_{}.py".format(
+            module_index // TESTS_PER_MODULE)), "".join(module))
+
+
+def _run_session(name, generate, *args):
+    # Generate a session in a temporary directory, run it and return its
+    # results.
+    directory = tempfile.mkdtemp(prefix="bench_{}_".format(name))
+    try:
+        _write(os.path.join(directory, "conftest.py"), CONFTEST)
+        generate(directory, *args)
+        results_path = os.path.join(directory, "results.json")
+        env = dict(os.environ, BENCH_RESULTS=results_path)
+        start = timeit.default_timer()
+        with open(os.devnull, "w") as devnull:
+            # The exit status is not checked: tests that save failures
+            # and warnings fail.
+            subprocess.call([sys.executable, "-m", "pytest", "-q", "-s",
+                             "-p", "no:cacheprovider", directory],
+                            stdout=devnull, stderr=devnull, cwd=directory,
+                            env=env)
+        duration = timeit.default_timer() - start
+        with open(results_path) as results_file:
+            results = json.load(results_file)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    results["session_s"] = duration
+    return dict(("{}.{}".format(name, key), value)
+                for key, value in results.items())
+
+
+def _median(values):
+    return sorted(values)[len(values) // 2]
+
+
+def _command_duration(command, cwd):
+    # Return the median duration of STARTUP_RUNS runs of a command.
+    durations = []
+    with open(os.devnull, "w") as devnull:
+        for i in range(STARTUP_RUNS):
+            start = timeit.default_timer()
+            subprocess.call(command, stdout=devnull, stderr=devnull, cwd=cwd)
+            durations.append(timeit.default_timer() - start)
+    return _median(durations)
+
+
+def run_startup():
+    """Return the plugin import and session startup results."""
+    directory = tempfile.mkdtemp(prefix="bench_startup_")
+    try:
+        _write(os.path.join(directory, "test_startup.py"),
+               "def test_startup():\n    pass\n")
+        import_durations = [
+            float(subprocess.check_output(
+                [sys.executable, "-c", IMPORT_TIME_SCRIPT], cwd=directory))
+            for i in range(STARTUP_RUNS)]
+        collect_only = [sys.executable, "-m", "pytest", "-q",
+                        "--collect-only", "-p", "no:cacheprovider", directory]
+        return {
+            "startup.plugin_import_s": _median(import_durations),
+            "startup.collect_only_s": _command_duration(collect_only,
+                                                        directory),
+            "startup.collect_only_without_plugin_s": _command_duration(
+                collect_only + ["-p", "no:verify"], directory)
+        }
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def run_suite(scale):
+    """Run the benchmarks of a scale and return the results
+    {name: value}.
+    """
+    results = run_startup()
+    results.update(_run_session("throughput", _generate_throughput_session,
+                           scale["verifications"]))
+    for tests in scale["tests"]:
+        name = "session_{}_tests".format(tests)
+        session_results = _run_session(name, _generate_session, tests)
+        session_results["{}.tests_per_sec".format(name)] = \
+            tests / session_results["{}.session_s".format(name)]
+        results.update(session_results)
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Return the names of the results worse than their baseline by
+    more than tolerance (a fraction of the baseline).
+    """
+    regressions = []
+    for name, base_value in sorted(baseline.items()):
+        if name not in results or not base_value:
+            continue
+        change = (results[name] - base_value) / float(base_value)
+        if name.endswith(HIGHER_IS_BETTER):
+            change = -change
+        if change > tolerance:
+            regressions.append(name)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", choices=sorted(SCALES), default="full")
+    parser.add_argument("--baseline", help="compare the results with this "
+                                           "baseline (JSON) file")
+    parser.add_argument("--save-baseline", help="save the results as a "
+                                                "baseline (JSON) file")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE,
+                        help="fraction a result may be worse than its "
+                             "baseline")
+    args = parser.parse_args(argv)
+
+    results = run_suite(SCALES[args.scale])
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)["results"]
+    for name, value in sorted(results.items()):
+        line = "{:<55}{:>16.2f}".format(name, value)
+        if name in baseline:
+            line += "{:>16.2f}".format(baseline[name])
+        print(line)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as baseline_file:
+            json.dump({"scale": args.scale, "python": sys.version.split()[0],
+                       "results": results}, baseline_file, indent=2,
+                      sort_keys=True)
+    regressions = compare(results, baseline, args.tolerance)
+    for name in regressions:
+        print("REGRESSION {}: {:.2f} (baseline {:.2f})".format(
+            name, results[name], baseline[name]))
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,235 @@
+"""Micro-benchmarks for the verify hot path.
+Run explicitly with the plugin loaded, e.g.:
+    pytest -s benchmarks/bench_verify.py
+"""
+import inspect
+import sys
+import timeit
+from array import array
+from pytest import fixture, log, verify, verify_array
+from pytest_verify.pytest_verify import (
+    CONFIG,
+    DEBUG,
+    FailureTraceback,
+    ResultStore,
+    Verifications,
+    VerificationException,
+    WarningException,
+    MAX_TRACEBACK_DEPTH,
+    _SOURCE_CACHE,
+    _debug_print,
+    _get_calling_func,
+    _raise_first_saved_exc_type,
+    _set_saved_raised,
+    _stack
+)
+
+ITERATIONS = 10000
+CAPTURE_ITERATIONS = 1000
+DEBUG_ITERATIONS = 100000
+ARRAY_SAMPLES = 10000000
+SAVED_WARNINGS = 100000
+
+
+class _ExpensiveRepr(object):
+    # Fixture object that is expensive to format (e.g. a device handle
+    # or packet capture).
+    repr_calls = 0
+
+    def __repr__(self):
+        _ExpensiveRepr.repr_calls += 1
+        return "x" * 1000000
+
+
+@fixture
+def expensive_repr_setup(request):
+    device = _ExpensiveRepr()
+    log.high_level_step("Benchmark passing verify calls in a fixture setup")
+    start = timeit.default_timer()
+    for i in range(ITERATIONS):
+        verify(device is not None, "passing setup verification")
+    duration = timeit.default_timer() - start
+    log.detail_step("{} passing setup verify calls in {:.3f}s ({:.0f} "
+                    "ops/sec)".format(ITERATIONS, duration,
+                                      ITERATIONS / duration))
+    return device
+
+
+def test_bench_passing_verify():
+    log.high_level_step("Benchmark passing verify calls")
+    start = timeit.default_timer()
+    for i in range(ITERATIONS):
+        verify(True, "passing verification")
+    duration = timeit.default_timer() - start
+    log.detail_step("{} passing verify calls in {:.3f}s ({:.0f} ops/sec)"
+                    .format(ITERATIONS, duration, ITERATIONS / duration))
+
+
+def test_bench_quiet_passing_verify():
+    log.high_level_step("Benchmark passing verify calls with quiet-passes")
+    quiet_passes = CONFIG["quiet-passes"].value
+    CONFIG["quiet-passes"].value = True
+    try:
+        start = timeit.default_timer()
+        for i in range(ITERATIONS):
+            verify(True, "passing verification")
+        duration = timeit.default_timer() - start
+    finally:
+        CONFIG["quiet-passes"].value = quiet_passes
+    log.detail_step("{} quiet passing verify calls in {:.3f}s ({:.0f} "
+                    "ops/sec)".format(ITERATIONS, duration,
+                                      ITERATIONS / duration))
+
+
+def test_bench_non_raising_failures():
+    log.high_level_step("Benchmark failing verify calls that don't raise")
+    session_store = Verifications.store
+    Verifications.store = ResultStore()
+    try:
+        start = timeit.default_timer()
+        for i in range(CAPTURE_ITERATIONS):
+            verify(False, "failing verification", raise_immediately=False)
+        duration = timeit.default_timer() - start
+    finally:
+        # Discard the saved failures
+        Verifications.store = session_store
+    log.detail_step("{} failing verify calls in {:.3f}s ({:.0f} ops/sec)"
+                    .format(CAPTURE_ITERATIONS, duration,
+                            CAPTURE_ITERATIONS / duration))
+
+
+def test_bench_passing_setup_verify(expensive_repr_setup):
+    verify(_ExpensiveRepr.repr_calls == 0, "Fixture objects are not "
+                                           "formatted by setup verifications")
+
+
+def _verify_capturing_stack():
+    # A passing verify call before the fast path was added: the stack and
+    # the source of the calling function were captured for every result.
+    stack = inspect.stack()
+    _get_calling_func(stack, 1, True, False)
+    verify(True, "passing")
+
+
+def test_bench_passing_frame_capture():
+    log.high_level_step("Benchmark result source capture")
+    # Passing results are logged (quiet-passes disabled)
+    quiet_passes = CONFIG["quiet-passes"].value
+    CONFIG["quiet-passes"].value = False
+    session_store = Verifications.store
+    Verifications.store = ResultStore()
+    try:
+        capture_time = timeit.timeit(_verify_capturing_stack,
+                                     number=CAPTURE_ITERATIONS)
+        verify_time = timeit.timeit(lambda: verify(True, "passing"),
+                                    number=CAPTURE_ITERATIONS)
+    finally:
+        # Discard the saved passes
+        Verifications.store = session_store
+        CONFIG["quiet-passes"].value = quiet_passes
+    speedup = capture_time / verify_time
+    log.detail_step("passing verify with stack capture: {:.3f}s, passing "
+                    "verify: {:.3f}s (x{:.1f})".format(capture_time,
+                                                       verify_time, speedup))
+    verify(speedup >= 10, "A passing verify call is at least 10x faster "
+                          "than with the stack captured")
+
+
+def test_bench_disabled_debug_print():
+    log.high_level_step("Benchmark debug messages for disabled categories")
+    verify(not DEBUG["verify"].enabled, "verify debug category is disabled",
+           raise_immediately=True)
+    device = _ExpensiveRepr()
+    repr_calls = _ExpensiveRepr.repr_calls
+
+    def lazy():
+        _debug_print("Device: {}", DEBUG["verify"], device)
+
+    def no_op():
+        pass
+
+    lazy_time = timeit.timeit(lazy, number=DEBUG_ITERATIONS)
+    no_op_time = timeit.timeit(no_op, number=DEBUG_ITERATIONS)
+    log.detail_step("{} disabled debug messages in {:.3f}s ({:.2f}us per "
+                    "message, no-op call {:.2f}us)"
+                    .format(DEBUG_ITERATIONS, lazy_time,
+                            lazy_time * 1e6 / DEBUG_ITERATIONS,
+                            no_op_time * 1e6 / DEBUG_ITERATIONS))
+    verify(_ExpensiveRepr.repr_calls == repr_calls, "Disabled debug messages "
+                                                    "are not formatted")
+    verify(lazy_time < no_op_time * 5, "A disabled debug message costs no "
+                                       "more than a few function calls")
+
+
+def test_bench_verify_array():
+    log.high_level_step("Benchmark verify_array over {} samples"
+                        .format(ARRAY_SAMPLES))
+    samples = array("d", [0.5]) * ARRAY_SAMPLES
+    start = timeit.default_timer()
+    for i in range(CAPTURE_ITERATIONS):
+        verify(samples[i] < 1.0, "sample is in range")
+    loop_duration = timeit.default_timer() - start
+    start = timeit.default_timer()
+    verify_array(samples, lambda x: x < 1.0, "samples are in range")
+    array_duration = timeit.default_timer() - start
+    log.detail_step("verify_array: {:.3f}s, verify for each sample: {:.0f}s "
+                    "(estimated from {} samples)"
+                    .format(array_duration, loop_duration * ARRAY_SAMPLES /
+                            CAPTURE_ITERATIONS, CAPTURE_ITERATIONS))
+    verify(array_duration * CAPTURE_ITERATIONS < loop_duration * ARRAY_SAMPLES,
+           "verify_array is faster than verifying each sample")
+
+
+def _format_traceback_uncached():
+    # Traceback formatting before the source cache was added.
+    stack = inspect.stack()
+    for frame_info in stack[:MAX_TRACEBACK_DEPTH]:
+        try:
+            inspect.getsourcelines(frame_info[0])
+        except Exception:
+            pass
+    return stack
+
+
+def _format_traceback_cached():
+    stack = _stack(sys._getframe(), MAX_TRACEBACK_DEPTH)
+    for depth in range(len(stack)):
+        _get_calling_func(stack, depth, False, False)
+    return stack
+
+
+def test_bench_failure_traceback_source():
+    log.high_level_step("Benchmark failure traceback source extraction")
+    _SOURCE_CACHE.clear()
+    uncached_time = timeit.timeit(_format_traceback_uncached,
+                                  number=CAPTURE_ITERATIONS)
+    cached_time = timeit.timeit(_format_traceback_cached,
+                                number=CAPTURE_ITERATIONS)
+    log.detail_step("inspect: {:.3f}s, source cache: {:.3f}s (x{:.1f})"
+                    .format(uncached_time, cached_time,
+                            uncached_time / cached_time))
+    verify(cached_time < uncached_time, "Traceback source extraction is "
+                                        "faster with the source cache")
+
+
+def test_bench_raise_bookkeeping():
+    log.high_level_step("Benchmark re-raise bookkeeping with {} saved "
+                        "warnings".format(SAVED_WARNINGS))
+    session_store = Verifications.store
+    Verifications.store = ResultStore()
+    try:
+        start = timeit.default_timer()
+        for i in xrange(SAVED_WARNINGS):
+            # A warning saved (not raised) in each phase
+            Verifications.store.add_traceback(
+                FailureTraceback(WarningException, None, []))
+            _raise_first_saved_exc_type(VerificationException)
+            _set_saved_raised()
+        duration = timeit.default_timer() - start
+    finally:
+        Verifications.store = session_store
+    log.detail_step("{} phases in {:.3f}s ({:.1f}us per phase)"
+                    .format(SAVED_WARNINGS, duration,
+                            duration * 1e6 / SAVED_WARNINGS))
+    verify(duration < 5, "Re-raise bookkeeping does not scale with the number "
+                         "of saved tracebacks")
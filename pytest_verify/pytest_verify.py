@@ -1,28 +1,73 @@
 import ConfigParser
-import decorator
+import functools
 import inspect
-import json
+import itertools
+import linecache
+import logging
 import os
-import pkg_resources
 import pytest
 import re
 import sys
+import threading
 import time
 import traceback
-from collections import OrderedDict
-from future.utils import raise_
+from array import array
+from collections import OrderedDict, deque
+# The pytest internals are imported by pytest (its builtin plugins) before
+# this plugin is loaded
 from _pytest.runner import CollectReport
 from _pytest.skipping import show_xfailed, show_xpassed, show_skipped
 from _pytest.terminal import WarningReport
-from _pytest.main import Session
 from _pytest.python import Module, Class
 try:
-    from _pytest.fixtures import FixtureDef
+    from reprlib import Repr
 except ImportError:
-    # pytest version < 3.0.0
-    from _pytest.python import FixtureDef
+    # python 2
+    from repr import Repr
+try:
+    from thread import get_ident as _get_ident
+except ImportError:
+    # python 3
+    from threading import get_ident as _get_ident
+try:
+    from time import perf_counter as _perf_counter
+except ImportError:
+    # python 2, time.time isn't monotonic
+    from monotonic import monotonic as _perf_counter
+# Stored by ResultColumns for results without a duration
+_NAN = float("nan")
+# numpy module (None if not installed), imported when verify_array is
+# first called (see _import_numpy)
+numpy = False
+
+_logger = logging.getLogger("pytest_verify")
 
 MAX_TRACEBACK_DEPTH = 20
+# Maximum length of the local variables of a traceback entry when
+# rendered as text (release-traceback-frames option).
+MAX_LOCALS_REPR_LENGTH = 1000
+_LOCALS_REPR = Repr()
+_LOCALS_REPR.maxstring = 80
+_LOCALS_REPR.maxother = 80
+# Default number of failing indices recorded in a verify_array result.
+MAX_ARRAY_FAILURE_INDICES = 10
+# Default number of failing elements included in a verify_each result.
+MAX_EACH_FAILURE_SAMPLES = 5
+# Default timeout and initial polling interval (seconds) of
+# verify_eventually.
+EVENTUALLY_TIMEOUT = 10.0
+EVENTUALLY_INTERVAL = 0.1
+# Default number of threads and timeout (seconds) of verify_concurrently.
+CONCURRENT_MAX_WORKERS = 16
+CONCURRENT_TIMEOUT = 60.0
+# Maximum number of source files kept in the source cache.
+SOURCE_CACHE_SIZE = 256
+# Maximum number of lines of a (multi-line) call included in a traceback.
+MAX_CALL_SOURCE_LINES = 10
+# Number of rows of the saved results table used to size its columns.
+TABLE_WIDTH_SAMPLE_ROWS = 1000
+# Number of lines of the saved results table logged together.
+TABLE_FLUSH_LINES = 1000
 
 
 class DebugFunctionality:
@@ -72,10 +117,51 @@ CONFIG = {"include-verify-local-vars":
           ConfigOption(bool, False, "Continue to the test call phase if the "
                                     "setup warns. To raise a setup warning "
                                     "this must be set to False and "
-                                    "raise-warnings set to True")}
+                                    "raise-warnings set to True"),
+          "release-traceback-frames":
+          ConfigOption(bool, False, "Render traceback local variables as "
+                                    "(size limited) text when a result is "
+                                    "saved and release the traceback frames "
+                                    "once they can no longer be raised"),
+          "compact-results":
+          ConfigOption(bool, False, "Store the saved results in compact "
+                                    "columns rather than as individual "
+                                    "objects. Reduces the memory used by "
+                                    "sessions that save many results"),
+          "results-file":
+          ConfigOption(str, "", "Write the saved results to this file (JSON "
+                                "lines) as they are saved rather than "
+                                "keeping them in memory"),
+          "quiet-passes":
+          ConfigOption(bool, False, "Count the passing verifications of each "
+                                    "step and log the count when the step "
+                                    "changes or the phase ends rather than "
+                                    "logging each one"),
+          "print-config":
+          ConfigOption(bool, False, "Print the plugin configuration when "
+                                    "the session starts"),
+          "results-table-rows":
+          ConfigOption(str, "all", "Rows of the saved results table: all or "
+                                   "failures (failures and warnings only)"),
+          "results-table-max-rows":
+          ConfigOption(int, 0, "Maximum number of rows of the saved results "
+                               "table (0 for no limit)"),
+          "results-table-cell-width":
+          ConfigOption(int, 80, "Maximum width of a column of the saved "
+                                "results table. Longer values are "
+                                "truncated"),
+          "slowest-timings":
+          ConfigOption(int, 5, "Number of the slowest fixtures, test phases "
+                               "and steps printed in the session summary "
+                               "(0 to not print them)")}
 
 SCOPE_ORDER = ("session", "class", "module", "function")
 
+# Result type codes
+RESULT_TYPES = OrderedDict((("P", "passed"), ("W", "warnings"),
+                            ("F", "failed"), ("A", "assertion errors"),
+                            ("O", "other exceptions")))
+
 
 class WarningException(Exception):
     pass
@@ -85,6 +171,11 @@ class VerificationException(Exception):
     pass
 
 
+# Exception types by name (results sent by xdist workers)
+_EXCEPTION_TYPES = {"WarningException": WarningException,
+                    "VerificationException": VerificationException}
+
+
 def pytest_addoption(parser):
     for name, val in CONFIG.iteritems():
         parser.addoption("--{}".format(name),
@@ -93,28 +184,61 @@ def pytest_addoption(parser):
                          help=val.help)
 
 
+# Configuration file installed with the plugin
+CONFIG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                           "config.cfg")
+# (path, modification time): parsed ConfigParser
+_config_file_cache = {}
+
+
+def _read_config_file(path):
+    # Return the parsed configuration file, only parsed again if it is
+    # modified.
+    try:
+        mtime = os.stat(path).st_mtime
+    except OSError:
+        mtime = None
+    key = (path, mtime)
+    if key not in _config_file_cache:
+        _config_file_cache.clear()
+        parser = ConfigParser.ConfigParser()
+        parser.read(path)
+        _config_file_cache[key] = parser
+    return _config_file_cache[key]
+
+
 @pytest.hookimpl(trylast=True)
 def pytest_configure(config):
+    # Results saved by other threads are buffered (see ThreadResults)
+    SessionStatus.thread_id = _get_ident()
+    SessionStatus.context = VerifyContext()
+    Timings.start = _perf_counter()
+    Timings.fixtures = OrderedDict()
+    Timings.fixture_starts = {}
+    Timings.steps = OrderedDict()
+    Timings.step = None
+    Timings.finished = False
     # Load user defined configuration from file
-    config_path = pkg_resources.resource_filename('pytest_verify', '')
-    parser = ConfigParser.ConfigParser()
-    parser.read(os.path.join(config_path, "config.cfg"))
+    parser = _read_config_file(CONFIG_FILE)
 
     for functionality in DEBUG.keys():
         try:
             DEBUG[functionality].enabled = parser.getboolean("debug",
                                                              functionality)
         except Exception as e:
-            print e
+            _logger.debug("Failed to read debug option %s: %s",
+                          functionality, e)
 
     for option in CONFIG.keys():
         try:
             if CONFIG[option].value_type is int:
                 CONFIG[option].value = parser.getint("general", option)
+            elif CONFIG[option].value_type is str:
+                CONFIG[option].value = parser.get("general", option)
             else:
                 CONFIG[option].value = parser.getboolean("general", option)
         except Exception as e:
-            print e
+            _logger.debug("Failed to read option %s: %s", option, e)
 
     for name, val in CONFIG.iteritems():
         cmd_line_val = config.getoption("--{}".format(name))
@@ -127,30 +251,50 @@ def pytest_configure(config):
             else:
                 CONFIG[name].value = CONFIG[name].value_type(cmd_line_val)
 
-    print "pytest-verify configuration:"
-    for option in CONFIG.keys():
-        print "{0}: type={1.value_type}, val={1.value}".format(option, CONFIG[
-            option])
+    if isinstance(Verifications.store, ChildResultStore):
+        # A session run by a (forked) child process of another session
+        Verifications.store = ResultStore()
+    _start_child_results()
+
+    log = getattr(pytest, "log", None)
+    if log is not None and not getattr(log.high_level_step, "starts_step",
+                                       False):
+        log.high_level_step = _step_function(log.high_level_step,
+                                             lambda args, kwargs: True)
+        log.step = _step_function(log.step, _is_top_level_step)
+
+    if _is_xdist_worker(config):
+        # Results are sent to the xdist controller with the test reports
+        Verifications.store = WorkerResultStore()
+    elif CONFIG["results-file"].value:
+        Verifications.store = StreamingResultStore(
+            JsonLinesResultSink(CONFIG["results-file"].value))
+    elif CONFIG["compact-results"].value:
+        Verifications.store = ColumnarResultStore()
+
+    if CONFIG["print-config"].value:
+        print "pytest-verify configuration:"
+        for option in CONFIG.keys():
+            print "{0}: type={1.value_type}, val={1.value}".format(
+                option, CONFIG[option])
 
 
 @pytest.hookimpl(hookwrapper=True)
 def pytest_runtest_setup(item):
-    _debug_print("SETUP - Starting setup for test {}".format(item.name),
-                 DEBUG["phases"])
-    _debug_print("SETUP - test {0.name} has fixtures: {0.fixturenames}".format(
-        item), DEBUG["scopes"])
+    _debug_print("SETUP - Starting setup for test {}", DEBUG["phases"],
+                 item.name)
+    _debug_print("SETUP - test {0.name} has fixtures: {0.fixturenames}",
+                 DEBUG["scopes"], item)
 
     SessionStatus.class_name = None
     SessionStatus.module = None
 
     def get_module_class(item):
         if isinstance(item.parent, Class):
-            _debug_print("Class is {}".format(item.parent.name),
-                         DEBUG["scopes"])
+            _debug_print("Class is {}", DEBUG["scopes"], item.parent.name)
             SessionStatus.class_name = item.parent.name
         if isinstance(item.parent, Module):
-            _debug_print("Module is {}".format(item.parent.name),
-                         DEBUG["scopes"])
+            _debug_print("Module is {}", DEBUG["scopes"], item.parent.name)
             SessionStatus.module = item.parent.name
             return
         next_item = item.parent
@@ -173,14 +317,20 @@ def pytest_runtest_setup(item):
     # Ignore the last fixture name 'request' TODO test if always true
     SessionStatus.test_fixtures[item.name] = item.fixturenames[:-1]
     SessionStatus.phase = "setup"
+    SessionStatus.last_fixture = None
+    _publish_context()
 
     outcome = yield
-    _debug_print("SETUP - Complete {}, outcome: {}".format(item, outcome),
-                 DEBUG["phases"])
+    _end_step()
+    _merge_thread_results()
+    _merge_child_results()
+    _log_quiet_passes()
+    _debug_print("SETUP - Complete {}, outcome: {}", DEBUG["phases"], item,
+                 outcome)
 
     raised_exc = outcome.excinfo
-    _debug_print("SETUP - Raised exception: {}".format(raised_exc),
-                 DEBUG["phases"])
+    _set_raised_by_thread(raised_exc)
+    _debug_print("SETUP - Raised exception: {}", DEBUG["phases"], raised_exc)
 
     if raised_exc:
         # Exception has been raised in the setup phase:
@@ -215,18 +365,24 @@ def pytest_runtest_setup(item):
 
     # TODO could this be done at start of pytest_pyfunc_call?
     SessionStatus.phase = "call"
+    SessionStatus.last_fixture = None
+    _publish_context()
 
 
 @pytest.hookimpl(hookwrapper=True)
 def pytest_pyfunc_call(pyfuncitem):
-    _debug_print("CALL - Starting {}".format(pyfuncitem.name), DEBUG["phases"])
+    _debug_print("CALL - Starting {}", DEBUG["phases"], pyfuncitem.name)
     outcome = yield
-    _debug_print("CALL - Completed {}, outcome {}".format(pyfuncitem, outcome),
-                 DEBUG["phases"])
+    _end_step()
+    _merge_thread_results()
+    _merge_child_results()
+    _log_quiet_passes()
+    _debug_print("CALL - Completed {}, outcome {}", DEBUG["phases"],
+                 pyfuncitem, outcome)
     # outcome.excinfo may be None or a (cls, val, tb) tuple
     raised_exc = outcome.excinfo
-    _debug_print("CALL - Caught exception: {}".format(raised_exc),
-                 DEBUG["phases"])
+    _set_raised_by_thread(raised_exc)
+    _debug_print("CALL - Caught exception: {}", DEBUG["phases"], raised_exc)
     if raised_exc:
         if raised_exc[0] not in (WarningException, VerificationException):
             # For exceptions other than Warning and Verifications:
@@ -235,7 +391,7 @@ def pytest_pyfunc_call(pyfuncitem):
             # * re-raise the exception
             _save_non_verify_exc(raised_exc)
             _set_saved_raised()
-            raise_(*raised_exc)
+            _raise(*raised_exc)
 
     # Re-raise first VerificationException not yet raised
     # Saved and immediately raised VerificationExceptions are raised here.
@@ -247,15 +403,22 @@ def pytest_pyfunc_call(pyfuncitem):
 
 @pytest.hookimpl(hookwrapper=True)
 def pytest_runtest_teardown(item, nextitem):
-    _debug_print("TEARDOWN - Starting {}".format(item), DEBUG["phases"])
+    _debug_print("TEARDOWN - Starting {}", DEBUG["phases"], item)
     SessionStatus.phase = "teardown"
+    SessionStatus.last_fixture = None
+    _publish_context()
     outcome = yield
-    _debug_print("TEARDOWN - completed {}, outcome: {}".format(item, outcome),
-                 DEBUG["phases"])
+    _end_step()
+    _merge_thread_results()
+    _merge_child_results()
+    _log_quiet_passes()
+    _debug_print("TEARDOWN - completed {}, outcome: {}", DEBUG["phases"],
+                 item, outcome)
 
     raised_exc = outcome.excinfo
-    _debug_print("TEARDOWN - Raised exception: {}".format(raised_exc),
-                 DEBUG["phases"])
+    _set_raised_by_thread(raised_exc)
+    _debug_print("TEARDOWN - Raised exception: {}", DEBUG["phases"],
+                 raised_exc)
 
     if raised_exc:
         # Exception has been raised in the setup phase:
@@ -284,11 +447,74 @@ def pytest_runtest_teardown(item, nextitem):
             _raise_first_saved_exc_type(WarningException)
 
 
+@pytest.hookimpl(hookwrapper=True)
+def pytest_fixture_setup(fixturedef, request):
+    # Track the fixture being setup. The fixtures it depends on are setup
+    # before this hook is called (by FixtureDef.execute) so they aren't
+    # included in its setup time.
+    _push_fixture(fixturedef)
+    start = _perf_counter()
+    yield
+    _add_fixture_time(fixturedef, "setup", _perf_counter() - start)
+    _pop_fixture(fixturedef)
+    # Finalizers are called last in first out so the fixture is pushed
+    # before its finalizers (registered during setup) are called.
+    fixturedef.addfinalizer(functools.partial(_start_fixture_teardown,
+                                              fixturedef))
+
+
+def pytest_fixture_post_finalizer(fixturedef):
+    # Called after all the fixture's finalizers
+    _pop_fixture(fixturedef)
+    start = Timings.fixture_starts.pop(fixturedef, None)
+    if start is not None:
+        _add_fixture_time(fixturedef, "teardown", _perf_counter() - start)
+
+
+def _start_fixture_teardown(fixturedef):
+    _push_fixture(fixturedef)
+    Timings.fixture_starts[fixturedef] = _perf_counter()
+
+
+def _add_fixture_time(fixturedef, phase, duration):
+    key = (fixturedef.scope, fixturedef.argname, phase)
+    timing = Timings.fixtures.get(key)
+    if timing is None:
+        Timings.fixtures[key] = [1, duration, duration]
+    else:
+        timing[0] += 1
+        timing[1] += duration
+        timing[2] = max(timing[2], duration)
+
+
+def _push_fixture(fixturedef):
+    SessionStatus.fixture_stack.append(fixturedef)
+    SessionStatus.last_fixture = fixturedef
+    _publish_context()
+
+
+def _pop_fixture(fixturedef):
+    stack = SessionStatus.fixture_stack
+    if stack and stack[-1] is fixturedef:
+        stack.pop()
+    elif fixturedef in stack:
+        # Not popped when expected (e.g. an exception was raised)
+        del stack[len(stack) - 1 - stack[::-1].index(fixturedef)]
+    _publish_context()
+
+
+def _fixture_info(fixturedef):
+    # Return the name and scope of a fixture (FixtureDef).
+    if fixturedef is None:
+        return None, None
+    return fixturedef.argname, fixturedef.scope
+
+
 def _save_non_verify_exc(raised_exc):
     exc_type = "O"
     exc_msg = str(raised_exc[1]).strip().replace("\n", " ")
-    _debug_print("Saving caught exception (non-plugin): {}, {}".format(
-        exc_type, exc_msg), DEBUG["not-plugin"])
+    _debug_print("Saving caught exception (non-plugin): {}, {}",
+                 DEBUG["not-plugin"], exc_type, exc_msg)
 
     stack_trace = traceback.extract_tb(raised_exc[2])
     frame = raised_exc[2]
@@ -305,8 +531,8 @@ def _save_non_verify_exc(raised_exc):
     while frame:
         locals_all_frames.append(frame.tb_frame.f_locals)
         frame = frame.tb_next
-    # _debug_print("all frames locals: {}".format(locals_all_frames),
-    #              DEBUG["not-plugin"])
+    # _debug_print("all frames locals: {}", DEBUG["not-plugin"],
+    #              locals_all_frames)
 
     trace_complete = []
     for i, tb_level in enumerate(reversed(stack_trace)):
@@ -319,138 +545,212 @@ def _save_non_verify_exc(raised_exc):
         trace_complete.insert(0, "{0[0]}:{0[1]}:{0[2]}".format(tb_level))
 
     # Divide by 3 as each failure has 3 lines (list entries)
-    _debug_print("# of tracebacks: {}".format(len(trace_complete) / 3),
-                 DEBUG["not-plugin"])
-    _debug_print("length of locals: {}".format(len(locals_all_frames)),
-                 DEBUG["not-plugin"])
-    if DEBUG["not-plugin"]:
+    _debug_print("# of tracebacks: {}", DEBUG["not-plugin"],
+                 len(trace_complete) / 3)
+    _debug_print("length of locals: {}", DEBUG["not-plugin"],
+                 len(locals_all_frames))
+    if DEBUG["not-plugin"].enabled:
         for line in trace_complete:
             _debug_print(line, DEBUG["not-plugin"])
 
-    fixture_name = None
-    fixture_scope = None
-    for i, stack_locals in enumerate(reversed(locals_all_frames)):
-        # Most recent stack entry first
-        # Extract the setup/teardown fixture information if possible
-        # keep track of the fixture name and scope
-        for item in stack_locals.values():
-            if isinstance(item, FixtureDef):
-                fixture_name = item.argname
-                fixture_scope = item.scope
-                _debug_print("scope for {} is {} [{}]".format(fixture_name,
-                             fixture_scope, i), DEBUG["not-plugin"])
-        if fixture_name:
-            break
-
-    _debug_print("saving: {}, {}".format(fixture_name, fixture_scope),
-                 DEBUG["not-plugin"])
-
-    # TODO refactor the saved_results format- make it an object
-    s_res = Verifications.saved_results
-    s_tb = Verifications.saved_tracebacks
-    s_tb.append(FailureTraceback(raised_exc[0], raised_exc[2], trace_complete,
-                                 raised=True))
+    # The fixture most recently setup or torn down (if any) in this
+    # phase raised the exception.
+    fixture_name, fixture_scope = _fixture_info(SessionStatus.last_fixture)
+
+    _debug_print("saving: {}, {}", DEBUG["not-plugin"], fixture_name,
+                 fixture_scope)
+
+    source_locals = locals_all_frames[-1]
+    exc_traceback = raised_exc[2]
+    if CONFIG["release-traceback-frames"].value:
+        # Already raised so the traceback is not required
+        trace_complete = _render_traceback_locals(trace_complete)
+        source_locals = _locals_repr(source_locals)
+        exc_traceback = None
+    del locals_all_frames
+
+    store = Verifications.store
+    failure_traceback = FailureTraceback(raised_exc[0], exc_traceback,
+                                         trace_complete, raised=True)
+    store.add_traceback(failure_traceback)
     if CONFIG["include-all-local-vars"].value:
         module_function_line = trace_complete[-3]
     else:
         module_function_line = trace_complete[-2]
-    s_res.append(Result(exc_msg, "FAIL", exc_type, fixture_scope,
-                        fixture_name, module_function_line, [trace_complete[-1]],
-                        True, source_locals=locals_all_frames[-1],
-                        fail_traceback_link=s_tb[-1]))
-    s_tb[-1].result_link = s_res[-1]
+    result = Result(exc_msg, "FAIL", exc_type, fixture_scope, fixture_name,
+                    module_function_line, [trace_complete[-1]], True,
+                    source_locals=source_locals,
+                    fail_traceback_link=failure_traceback)
+    failure_traceback.result_link = result
+    store.add_result(result)
+
+
+def _set_raised_by_thread(raised_exc):
+    # The exception raised by a test phase may have been raised by verify
+    # in another thread and passed on to the test (e.g. by a thread
+    # pool). The saved results are then set as raised as if it was
+    # raised by the session thread, so it isn't raised again.
+    if raised_exc and \
+            Verifications.store.find_exception(raised_exc[1]) is not None:
+        _set_saved_raised()
 
 
 def _raise_first_saved_exc_type(type_to_raise):
-    for i, saved_traceback in enumerate(Verifications.saved_tracebacks):
+    saved_traceback = Verifications.store.first_unraised(type_to_raise)
+    _debug_print("first saved traceback not raised of type {}: {}",
+                 DEBUG["verify"], type_to_raise, saved_traceback)
+    if saved_traceback:
         exc_type = saved_traceback.exc_type
-        _debug_print("saved traceback index: {}, type: {}, searching for: {}"
-                     .format(i, exc_type, type_to_raise), DEBUG["verify"])
-        if exc_type == type_to_raise and not saved_traceback.raised:
-            msg = "{0.msg} - {0.status}".format(saved_traceback.result_link)
-            tb = saved_traceback.exc_traceback
-            print "Re-raising first saved {}: {} {} {}".\
-                format(type_to_raise, exc_type, msg, tb)
-            _set_saved_raised()
-            raise_(exc_type, msg, tb)  # for python 2 and 3 compatibility
+        msg = "{0.msg!s} - {0.status}".format(saved_traceback.result_link)
+        # Only verify results are saved unraised and they are saved
+        # without an exception or traceback object, so the exception is
+        # created here (the traceback of the call to verify was formatted
+        # when the result was saved).
+        _logger.debug("Re-raising first saved %s: %s", exc_type.__name__,
+                      msg)
+        _set_saved_raised()
+        _raise(exc_type, msg)
+
+
+def _raise(exc_type, value=None, tb=None):
+    # Raise an exception with a traceback (python 2 and 3 compatible).
+    # future is only imported when an exception is raised.
+    from future.utils import raise_
+    raise_(exc_type, value, tb)
+
+
+def _is_xdist_worker(config):
+    # pytest-xdist < 1.22 uses slaveinput
+    return hasattr(config, "workerinput") or hasattr(config, "slaveinput")
+
+
+def _xdist_worker_id(config):
+    worker_input = getattr(config, "workerinput", None) or \
+        getattr(config, "slaveinput")
+    return worker_input.get("workerid", worker_input.get("slaveid"))
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_makereport(item, call):
+    outcome = yield
+    store = Verifications.store
+    if isinstance(store, WorkerResultStore):
+        # Attach the results saved during this phase to the report so
+        # they are sent to the xdist controller.
+        report = outcome.get_result()
+        if call.when == "setup":
+            report.verify_test = SessionStatus.run_order[-1] + (
+                SessionStatus.test_fixtures[SessionStatus.test_function],)
+        report.verify_records = store.take_records()
+        report.verify_worker = _xdist_worker_id(item.config)
+
+
+def pytest_runtest_logreport(report):
+    # Merge the test and results of a report sent by an xdist worker.
+    if isinstance(Verifications.store, WorkerResultStore):
+        # Report created by this worker
+        return
+    verify_test = getattr(report, "verify_test", None)
+    if verify_test:
+        module_name, class_name, test_function, fixtures = verify_test
+        SessionStatus.run_order.append((module_name, class_name,
+                                        test_function))
+        SessionStatus.test_fixtures[test_function] = fixtures
+        # Module and class scoped fixtures are setup by each worker
+        SessionStatus.test_workers[test_function] = report.verify_worker
+    for record in getattr(report, "verify_records", ()):
+        result = _result_from_record(record, None)
+        result.worker = _intern(report.verify_worker)
+        if result.traceback_link:
+            Verifications.store.add_traceback(result.traceback_link)
+        Verifications.store.add_result(result)
 
 
 def pytest_report_teststatus(report):
-    _debug_print("TEST REPORT FOR {} PHASE".format(report.when),
-                 DEBUG["phases"])
+    _debug_print("TEST REPORT FOR {} PHASE", DEBUG["phases"], report.when)
 
 
 def print_new_results(phase):
-    for i, s_res in enumerate(Verifications.saved_results):
+    for i, s_res in enumerate(Verifications.store.results):
         res_info = s_res["Extra Info"]
         if res_info.phase == phase and not res_info.printed:
-            _debug_print("Valid result ({}) found with info: {}"
+            _debug_print(lambda: "Valid result ({}) found with info: {}"
                          .format(i, res_info.format_result_info()),
                          DEBUG["scopes"])
             res_info.printed = True
 
 
+def pytest_unconfigure(config):
+    # Merge the last results of child processes before the store is
+    # closed
+    _stop_child_results()
+    Verifications.store.close()
+
+
 def pytest_terminal_summary(terminalreporter):
     """ override the terminal summary reporting. """
     _debug_print("In pytest_terminal_summary", DEBUG["summary"])
-    if DEBUG["summary"]:
+    _end_step()
+    Timings.finished = True
+    _merge_thread_results()
+    _merge_child_results()
+    _log_quiet_passes()
+    # Rebuild the results saved to a file (results-file option)
+    Verifications.store = Verifications.store.summary_store()
+    if DEBUG["summary"].enabled:
         _debug_print("Run order:", DEBUG["summary"])
         for module_class_function in SessionStatus.run_order:
-            _debug_print("{0[0]}::{0[1]}::{0[2]}".format(module_class_function)
-                         , DEBUG["summary"])
+            _debug_print("{0[0]}::{0[1]}::{0[2]}", DEBUG["summary"],
+                         module_class_function)
 
     # if DEBUG["verify"]:
     #     print "Saved Results (dictionaries)"
-    #     for i, res in enumerate(Verifications.saved_results):
+    #     for i, res in enumerate(Verifications.store.results):
     #         print "{} - {}".format(i, res.__dict__)
     #     print "Saved Tracebacks (dictionaries)"
-    #     for i, tb in enumerate(Verifications.saved_tracebacks):
+    #     for i, tb in enumerate(Verifications.store.tracebacks):
     #         print "{} - {}".format(i, tb.__dict__)
 
-    if DEBUG["verify"]:
-        for res in Verifications.saved_results:
+    if DEBUG["verify"].enabled:
+        for res in Verifications.store.results:
             if res.traceback_link:
-                for saved_tb in Verifications.saved_tracebacks:
+                for saved_tb in Verifications.store.tracebacks:
                     if saved_tb.result_link == res:
-                        _debug_print("Found linked result and traceback {} {}".
-                                     format(res, saved_tb), DEBUG["verify"])
+                        _debug_print("Found linked result and traceback {} {}",
+                                     DEBUG["verify"], res, saved_tb)
 
     # Retrieve the saved results and traceback info for any failed
     # verifications.
     print_saved_results(extra_info=True)
 
-    saved_tracebacks = Verifications.saved_tracebacks
+    saved_tracebacks = Verifications.store.tracebacks
     if saved_tracebacks:
         pytest.log.high_level_step("Saved tracebacks")
     for i, saved_tb in enumerate(saved_tracebacks):
-        _debug_print("Traceback {}".format(i), DEBUG["summary"])
+        _debug_print("Traceback {}", DEBUG["summary"], i)
         for line in saved_tb.formatted_traceback:
             pytest.log.step(line)
         pytest.log.step("{}: {}".format(saved_tb.exc_type.__name__,
                                         saved_tb.result_link.msg))
+        if saved_tb.occurrences > 1:
+            pytest.log.step("(occurred {} times)".format(
+                saved_tb.occurrences))
 
     _debug_print("Test function fixture dependencies:", DEBUG["summary"])
     for test_name, setup_fixtures in SessionStatus.test_fixtures.iteritems():
-        _debug_print("{} depends on setup fixtures: {}"
+        _debug_print(lambda: "{} depends on setup fixtures: {}"
                      .format(test_name, ", ".join(setup_fixtures)),
                      DEBUG["summary"])
 
-    # Collect all the results for each reported phase/scope(/fixture)
-    result_by_fixture = OrderedDict()
+    # Results for each reported phase/scope(/fixture) are collected as
+    # they are saved.
+    store = Verifications.store
     _debug_print("Scope/phase saved results summary in executions order:",
                  DEBUG["summary"])
-    for saved_result in Verifications.saved_results:
-        key = "{0.fixture_name}:{0.test_function}:{0.phase}:{0.scope}"\
-            .format(saved_result)
-        if key not in result_by_fixture:
-            result_by_fixture[key] = {}
-            result_by_fixture[key][saved_result.type_code] = 1
-        elif saved_result.type_code not in result_by_fixture[key]:
-            result_by_fixture[key][saved_result.type_code] = 1
-        else:
-            result_by_fixture[key][saved_result.type_code] += 1
-    for key, val in result_by_fixture.iteritems():
-        _debug_print("{}: {}".format(key, val), DEBUG["summary"])
+    if DEBUG["summary"].enabled:
+        for key, val in store.type_counts.iteritems():
+            _debug_print("{0[5]}:{0[2]}:{0[3]}:{0[4]}: {1}", DEBUG["summary"],
+                         key, val)
 
     # Consolidated test results - plugin saved results and parsed pytest
     # reports
@@ -458,8 +758,10 @@ def pytest_terminal_summary(terminalreporter):
     # Search backwards through the fixture results to find setup results
     for module_class_function in SessionStatus.run_order:
         module_name, class_name, test_function = module_class_function
-        _debug_print("Setup teardown fixture results to collate: {}".format(
-            SessionStatus.test_fixtures[test_function]), DEBUG["summary"])
+        worker = SessionStatus.test_workers.get(test_function)
+        _debug_print("Setup teardown fixture results to collate: {}",
+                     DEBUG["summary"],
+                     SessionStatus.test_fixtures[test_function])
 
         # TODO if no fixtures in fixture_results the phase must be passed
         # fixtures = SessionStatus.test_fixtures[test_function]
@@ -468,20 +770,16 @@ def pytest_terminal_summary(terminalreporter):
         for phase in ("setup", "teardown"):
             fixture_results[phase] = {"overall": {}}
             # Module scoped fixtures
-            m_res = _filter_scope_phase("module", "module", module_name, phase)
-            fixture_results[phase]["module"] = _filter_fixture(m_res)
+            fixture_results[phase]["module"] = store.fixture_results(
+                "module", module_name, phase, worker)
             # Class scoped fixtures
-            c_res = _filter_scope_phase("class_name", "class", class_name,
-                                       phase)
-            fixture_results[phase]["class"] = _filter_fixture(c_res)
+            fixture_results[phase]["class"] = store.fixture_results(
+                "class", class_name, phase, worker)
             # Function scoped fixtures
-            f_res = _filter_scope_phase("test_function", "function",
-                                       test_function, phase)
-            fixture_results[phase]["function"] = _filter_fixture(f_res)
+            fixture_results[phase]["function"] = store.fixture_results(
+                "function", test_function, phase, worker)
         # Call (test function) results
-        call = filter(lambda x: x.test_function == test_function and
-                      x.phase == "call", Verifications.saved_results)
-        call_res_summary = _results_summary(call)
+        call, call_res_summary = store.call_results(test_function)
         fixture_results["call"] = {"results": call,
                                    "overall": {"saved": call_res_summary}}
         test_results[test_function] = fixture_results
@@ -493,15 +791,17 @@ def pytest_terminal_summary(terminalreporter):
     # collated for printing later.
     pytest_reports = terminalreporter.stats
     reports_total = sum(len(v) for k, v in pytest_reports.items())
-    _debug_print("{} pytest reports".format(reports_total), DEBUG["summary"])
+    _debug_print("{} pytest reports", DEBUG["summary"], reports_total)
     total_session_duration = 0
+    # (duration, test function, phase) of each test phase
+    phase_durations = []
     collect_error_reports = []
     pytest_warning_reports = []
     summary_results = {}
     for report_type, reports in pytest_reports.iteritems():
         for report in reports:
-            _debug_print("Report type: {}, report: {}".format(
-                report_type, report), DEBUG["summary"])
+            _debug_print("Report type: {}, report: {}", DEBUG["summary"],
+                         report_type, report)
             if isinstance(report, CollectReport):
                 # Don't add to test_results dictionary
                 _debug_print("Found CollectReport", DEBUG["summary"])
@@ -524,6 +824,8 @@ def pytest_terminal_summary(terminalreporter):
                     "duration": report.duration
                 }
                 total_session_duration += report.duration
+                phase_durations.append((report.duration,
+                                        report.location[2], report.when))
                 # test report location[2] for a standalone test function
                 # within a module is just the function name, for class
                 # based tests it is in the format:
@@ -531,6 +833,10 @@ def pytest_terminal_summary(terminalreporter):
                 test_results[report.location[2].split(".")[-1]][report.when][
                     "overall"]["pytest"] = parsed_report
 
+    if CONFIG["slowest-timings"].value:
+        _print_slowest_timings(CONFIG["slowest-timings"].value,
+                               phase_durations)
+
     # For each test: determine the result for each phase and the overall test
     # result.
     for test_function, test_result in test_results.iteritems():
@@ -615,8 +921,8 @@ def pytest_terminal_summary(terminalreporter):
                      "warnings", DEBUG["summary"])
 
     session_duration = time.time() - terminalreporter._sessionstarttime
-    _debug_print("Session duration: {}s (sum of phases: {}s)".format(
-        session_duration, total_session_duration), DEBUG["summary"])
+    _debug_print("Session duration: {}s (sum of phases: {}s)",
+                 DEBUG["summary"], session_duration, total_session_duration)
     _debug_print(summary_results, DEBUG["summary"])
 
     outcomes = []
@@ -711,61 +1017,859 @@ def _phase_specific_result(phase, summary_result):
         return summary_result
 
 
-def _filter_scope_phase(result_att, scope, scope_name, phase):
-    s_r = Verifications.saved_results
-    scope_results = filter(lambda x: getattr(x, result_att) == scope_name
-                           and x.scope == scope, s_r)
-    return filter(lambda y: y.phase == phase, scope_results)
-
-
-def _results_summary(results):
-    summary = {}
-    for result in results:
-        if result.type_code not in summary:
-            summary[result.type_code] = 1
+def _add_type_counts(summary, type_counts):
+    # Add the type_code counters type_counts to summary.
+    for type_code, count in type_counts.iteritems():
+        if type_code not in summary:
+            summary[type_code] = count
         else:
-            summary[result.type_code] += 1
-    return summary
-
-
-def _filter_fixture(results):
-    results_by_fixture = OrderedDict()
-    for res in results:
-        if res.fixture_name not in results_by_fixture:
-            results_by_fixture[res.fixture_name] = [res]
-        else:
-            results_by_fixture[res.fixture_name].append(res)
-    for fix_name, fix_results in results_by_fixture.iteritems():
-        f_res_summary = _results_summary(fix_results)
-        results_by_fixture[fix_name].append(f_res_summary)
-    return results_by_fixture
+            summary[type_code] += count
 
 
 def pytest_namespace():
     # Add verify functions to the pytest namespace
     def verify(fail_condition, fail_message, raise_immediately=True,
                warning=False, warn_condition=None, warn_message=None,
-               full_method_trace=False, stop_at_test=True, log_level=None):
-        """Print a message at the highest log level."""
-        _verify(fail_condition, fail_message, raise_immediately,
-                warning, warn_condition, warn_message,
+               full_method_trace=False, stop_at_test=True, log_level=None,
+               fail_args=None, warn_args=None):
+        """Print a message at the highest log level.
+        The messages may be callables or format templates (for fail_args
+        and warn_args) that are only evaluated if the text is required.
+        """
+        _verify(fail_condition, _lazy_message(fail_message, fail_args),
+                raise_immediately, warning, warn_condition,
+                _lazy_message(warn_message, warn_args),
                 full_method_trace, stop_at_test, log_level)
 
+    def verify_array(values, condition, fail_message, raise_immediately=True,
+                     warning=False, warn_condition=None, warn_message=None,
+                     full_method_trace=False, stop_at_test=True,
+                     log_level=None, max_indices=MAX_ARRAY_FAILURE_INDICES,
+                     fail_args=None, warn_args=None):
+        """Verify a condition over every element of an array, saving a
+        single result that summarises the failing elements.
+        """
+        failures, warnings, total = _check_array(values, condition,
+                                                 warn_condition, max_indices)
+        _verify_samples(failures, warnings, total,
+                        _lazy_message(fail_message, fail_args),
+                        raise_immediately, warning,
+                        _lazy_message(warn_message, warn_args),
+                        full_method_trace, stop_at_test, log_level)
+
+    def verify_each(iterable, predicate, fail_message, raise_immediately=True,
+                    warning=False, warn_predicate=None, warn_message=None,
+                    full_method_trace=False, stop_at_test=True,
+                    log_level=None, max_failures=None,
+                    max_samples=MAX_EACH_FAILURE_SAMPLES, fail_args=None,
+                    warn_args=None):
+        """Verify a predicate for each element of an iterable, saving a
+        single result that summarises the failing elements. Elements are
+        consumed lazily and checking stops after max_failures failures.
+        """
+        failures, warnings, total = _check_each(iterable, predicate,
+                                                warn_predicate, max_failures,
+                                                max_samples)
+        _verify_samples(failures, warnings, total,
+                        _lazy_message(fail_message, fail_args),
+                        raise_immediately, warning,
+                        _lazy_message(warn_message, warn_args),
+                        full_method_trace, stop_at_test, log_level)
+
+    def verify_eventually(condition_fn, fail_message,
+                          timeout=EVENTUALLY_TIMEOUT,
+                          interval=EVENTUALLY_INTERVAL, backoff=1.0,
+                          max_interval=None, raise_immediately=True,
+                          warning=False, full_method_trace=False,
+                          stop_at_test=True, log_level=None, fail_args=None):
+        """Poll condition_fn until it returns a true value or timeout
+        seconds have elapsed, saving a single result of the final
+        outcome with the number of attempts and the elapsed time. The
+        interval between attempts is multiplied by backoff after each
+        attempt (up to max_interval).
+        """
+        started = _perf_counter()
+        check = EventualCheck(condition_fn, timeout, interval, backoff,
+                              max_interval)
+        for delay in check.poll():
+            time.sleep(delay)
+        _verify_for_caller(check.passed,
+                           check.describe(_lazy_message(fail_message,
+                                                        fail_args)),
+                           raise_immediately, warning, None, None,
+                           full_method_trace, stop_at_test, log_level,
+                           started)
+
+    def verify_concurrently(checks, fail_message,
+                            max_workers=CONCURRENT_MAX_WORKERS,
+                            timeout=CONCURRENT_TIMEOUT,
+                            raise_immediately=True, warning=False,
+                            full_method_trace=False, stop_at_test=True,
+                            log_level=None, fail_args=None):
+        """Run check callables concurrently on up to max_workers threads,
+        saving a result for each check (passes if it returns a true
+        value) and a result for the whole batch, which is raised
+        according to raise_immediately and warning. checks is a mapping
+        of name: callable or an iterable of callables (named by index).
+        Checks that have not completed after timeout seconds fail.
+        """
+        if max_workers < 1:
+            raise ValueError("verify_concurrently max_workers must be at "
+                             "least 1 (got {})".format(max_workers))
+        batch = [BatchCheck(name, check_fn) for name, check_fn in
+                 (checks.items() if hasattr(checks, "items")
+                  else enumerate(checks))]
+        started = _perf_counter()
+        context = VerifyContext.capture()
+        _run_concurrently(batch, max_workers, timeout, context)
+        elapsed = _perf_counter() - started
+        fail_message = _lazy_message(fail_message, fail_args)
+        # Outcomes of checks still running are ignored from here on and
+        # so are the results they save
+        context.expired = True
+        outcomes = [check.outcome for check in batch]
+        for check, outcome in zip(batch, outcomes):
+            _verify_for_caller(outcome is not None and outcome[0],
+                               check.describe(fail_message, outcome), False,
+                               warning, None, None, full_method_trace,
+                               stop_at_test, log_level,
+                               duration=elapsed if outcome is None
+                               else outcome[2])
+        _verify_for_caller(all(outcome is not None and outcome[0]
+                               for outcome in outcomes),
+                           _describe_batch(fail_message, outcomes, elapsed),
+                           raise_immediately, warning, None, None,
+                           full_method_trace, stop_at_test, log_level,
+                           started)
+
+    def verify_context():
+        """Capture the current test context (module, class, test
+        function, phase, fixture and step). Verifications made by other
+        threads within the context (or functions bound to it with
+        VerifyContext.bind) are saved in that context.
+        """
+        return VerifyContext.capture()
+
     def get_saved_results():
         """Development only function.
         """
-        return Verifications.saved_results, Verifications.saved_tracebacks
+        return Verifications.store.results, Verifications.store.tracebacks
 
     name = {"verify": verify,
+            "verify_array": verify_array,
+            "verify_each": verify_each,
+            "verify_eventually": verify_eventually,
+            "verify_concurrently": verify_concurrently,
+            "verify_context": verify_context,
             "get_saved_results": get_saved_results}
     return name
 
 
+class ResultStore(object):
+    """Saved results and tracebacks in the order they were saved.
+    The results are indexed as they are added by (module, class,
+    test function, phase, scope, fixture name, xdist worker) with a
+    count of each result type_code per key, so the summary can be
+    collated without searching through every saved result for each
+    test.
+    """
+    # Result attribute that identifies the owner of each fixture scope
+    SCOPE_NAME_ATTRIBUTES = {"module": "module",
+                             "class": "class_name",
+                             "function": "test_function"}
+
+    def __init__(self):
+        self.results = []
+        self.tracebacks = []
+        # key: indexes of the key's results in self.results
+        self.results_by_key = OrderedDict()
+        # key: {type_code: count}
+        self.type_counts = OrderedDict()
+        # (scope, scope name, phase, worker): keys in the order they were
+        # added
+        self._scope_phase_keys = {}
+        # test function: keys of call phase results in the order they
+        # were added
+        self._call_keys = {}
+        # All tracebacks are set as raised together so those not yet
+        # raised are the tracebacks from index _raised_count onwards.
+        self._raised_count = 0
+        # exc_type: first traceback of exc_type not yet raised
+        self._first_unraised = {}
+        # Stack signature: traceback not yet raised (see find_traceback)
+        self._unraised_by_signature = {}
+
+    def add_result(self, result):
+        row = len(self.results)
+        self.results.append(result)
+        self._index_result(row, result)
+
+    def _index_result(self, row, result):
+        # Index the result saved at row of self.results.
+        key = (result.module, result.class_name, result.test_function,
+               result.phase, result.scope, result.fixture_name,
+               result.worker)
+        if key not in self.results_by_key:
+            self.results_by_key[key] = array("l")
+            self.type_counts[key] = {}
+            self._index_key(key, result)
+        self.results_by_key[key].append(row)
+        type_counts = self.type_counts[key]
+        if result.type_code not in type_counts:
+            type_counts[result.type_code] = 1
+        else:
+            type_counts[result.type_code] += 1
+
+    def _index_key(self, key, result):
+        # Add a new key to the scope/phase and call phase indexes.
+        if result.phase == "call":
+            self._call_keys.setdefault(result.test_function, []).append(key)
+        elif result.scope in self.SCOPE_NAME_ATTRIBUTES:
+            scope_name = getattr(result,
+                                 self.SCOPE_NAME_ATTRIBUTES[result.scope])
+            self._scope_phase_keys.setdefault(
+                (result.scope, scope_name, result.phase, result.worker),
+                []).append(key)
+
+    def add_traceback(self, failure_traceback, signature=None):
+        self.tracebacks.append(failure_traceback)
+        if not failure_traceback.raised:
+            self._first_unraised.setdefault(failure_traceback.exc_type,
+                                            failure_traceback)
+            if signature is not None:
+                self._unraised_by_signature[signature] = failure_traceback
+
+    def find_traceback(self, signature):
+        """Return the saved traceback, not yet raised, with the stack
+        signature (see _stack_signature). None if there isn't one.
+        """
+        return self._unraised_by_signature.get(signature)
+
+    def find_exception(self, exception):
+        """Return the saved traceback, not yet raised, of an exception
+        raised by another thread (None if there isn't one).
+        """
+        for saved_traceback in self.tracebacks[self._raised_count:]:
+            if saved_traceback.exception is exception:
+                return saved_traceback
+        return None
+
+    def first_unraised(self, exc_type):
+        """Return the first saved traceback of exc_type that has not
+        been raised (None if there isn't one).
+        """
+        return self._first_unraised.get(exc_type)
+
+    def set_raised(self, release_frames=False):
+        """Set all the saved tracebacks as raised. Each traceback is
+        only updated the first time it is set as raised.
+        release_frames -- release the traceback objects (and frames)
+        which are never raised again.
+        """
+        for saved_traceback in self.tracebacks[self._raised_count:]:
+            saved_traceback.raised = True
+            if release_frames:
+                saved_traceback.exc_traceback = None
+        self._raised_count = len(self.tracebacks)
+        self._first_unraised.clear()
+        self._unraised_by_signature.clear()
+
+    def summary_store(self):
+        """Return the store containing all the saved results for the
+        session summary.
+        """
+        return self
+
+    def close(self):
+        pass
+
+    def fixture_results(self, scope, scope_name, phase, worker=None):
+        """Return the results for the fixtures of scope owned by
+        scope_name (module, class or test function name) in the
+        specified phase (and xdist worker). Format: {fixture name:
+        [result, ..., {type_code: count}]}.
+        """
+        keys_by_fixture = OrderedDict()
+        for key in self._scope_phase_keys.get(
+                (scope, scope_name, phase, worker), ()):
+            keys_by_fixture.setdefault(key[5], []).append(key)
+        results_by_fixture = OrderedDict()
+        for fixture_name, keys in keys_by_fixture.iteritems():
+            fixture_results, summary = self._key_results(keys)
+            fixture_results.append(summary)
+            results_by_fixture[fixture_name] = fixture_results
+        return results_by_fixture
+
+    def call_results(self, test_function):
+        """Return the call phase results of test_function and their
+        summary {type_code: count}.
+        """
+        return self._key_results(self._call_keys.get(test_function, ()))
+
+    def _key_results(self, keys):
+        # Results of all the keys in the order they were saved and their
+        # summary {type_code: count}. Each key's rows are in save order
+        # so they are merged by row.
+        summary = {}
+        for key in keys:
+            _add_type_counts(summary, self.type_counts[key])
+        import heapq
+        rows = heapq.merge(*[self.results_by_key[key] for key in keys])
+        return [self.results[row] for row in rows], summary
+
+
+class ColumnarResultStore(ResultStore):
+    """ResultStore that keeps the saved results in compact columns
+    rather than as Result objects. Results are rebuilt from the columns
+    when they are accessed.
+    """
+    def __init__(self):
+        super(ColumnarResultStore, self).__init__()
+        self.results = ResultColumns()
+
+
+class ResultColumns(object):
+    """Sequence of results stored as columns of indexes into a table of
+    distinct field values. Only results with a traceback or extracted
+    source (failures and warnings) are kept as Result objects. The
+    other results are rebuilt as ColumnResults when they are accessed,
+    the same object is returned for a row while it is referenced.
+    """
+    FIELDS = ("step", "msg", "status", "type_code", "class_name", "module",
+              "phase", "scope", "test_function", "fixture_name", "worker")
+    RAISE_IMMEDIATELY = 1
+    PRINTED = 2
+
+    def __init__(self):
+        self._values = [None]
+        self._value_ids = {None: 0}
+        self._columns = [array("i") for _ in self.FIELDS]
+        self._flags = array("b")
+        # Code location (filename and function value ids, line number)
+        self._locations = array("i")
+        # Timestamp and duration (NaN if not measured) of each result
+        self._times = array("d")
+        # Row: Result for results with source or traceback information
+        self._objects = {}
+        # Row: ColumnResult rebuilt from the columns and still referenced
+        import weakref
+        self._rebuilt = weakref.WeakValueDictionary()
+
+    def _value_id(self, value):
+        try:
+            return self._value_ids[value]
+        except KeyError:
+            self._value_ids[value] = len(self._values)
+            self._values.append(value)
+            return self._value_ids[value]
+
+    def append(self, result):
+        if result.traceback_link or result.source_code is not None:
+            self._objects[len(self._flags)] = result
+        for field, column in zip(self.FIELDS, self._columns):
+            column.append(self._value_id(getattr(result, field)))
+        self._flags.append(
+            (self.RAISE_IMMEDIATELY if result.raise_immediately else 0) |
+            (self.PRINTED if result.printed else 0))
+        if result._source_location:
+            filename, line_number, function = result._source_location
+            self._locations.extend((self._value_id(filename), line_number,
+                                    self._value_id(function)))
+        else:
+            self._locations.extend((0, 0, 0))
+        self._times.extend((result.timestamp, _NAN if result.duration is None
+                            else result.duration))
+
+    def __len__(self):
+        return len(self._flags)
+
+    def __iter__(self):
+        for row in xrange(len(self)):
+            yield self[row]
+
+    def __getitem__(self, row):
+        if row < 0:
+            row += len(self)
+        if row in self._objects:
+            return self._objects[row]
+        result = self._rebuilt.get(row)
+        if result is not None:
+            return result
+        values = self._values
+        result = ColumnResult.__new__(ColumnResult)
+        result._columns = self
+        result._row = row
+        for field, column in zip(self.FIELDS, self._columns):
+            setattr(result, field, values[column[row]])
+        result.raise_immediately = bool(self._flags[row] &
+                                        self.RAISE_IMMEDIATELY)
+        filename, line_number, function = self._locations[3*row:3*row+3]
+        if filename:
+            result._source_location = (values[filename], line_number,
+                                       values[function])
+        else:
+            result._source_location = None
+        result.timestamp = self._times[2*row]
+        duration = self._times[2*row+1]
+        result.duration = None if duration != duration else duration
+        result.source_function = None
+        result.source_code = None
+        result.source_locals = None
+        result.traceback_link = None
+        self._rebuilt[row] = result
+        return result
+
+    def set_printed(self, row, printed):
+        if printed:
+            self._flags[row] |= self.PRINTED
+        else:
+            self._flags[row] &= ~self.PRINTED
+
+
+class StreamingResultStore(ResultStore):
+    """ResultStore that writes the results to a sink as they are saved
+    rather than keeping them in memory. Only the tracebacks (and their
+    results) and the index of the results are kept. Other results are
+    read back from the sink when they are accessed.
+    """
+    def __init__(self, sink):
+        super(StreamingResultStore, self).__init__()
+        self.sink = sink
+        self.results = ResultRecords(sink, self.tracebacks)
+        # Traceback: index in self.tracebacks
+        self._traceback_indexes = {}
+
+    def add_traceback(self, failure_traceback, signature=None):
+        self._traceback_indexes[failure_traceback] = len(self.tracebacks)
+        super(StreamingResultStore, self).add_traceback(failure_traceback,
+                                                        signature)
+
+    def add_result(self, result):
+        traceback_index = None
+        if result.traceback_link:
+            traceback_index = self._traceback_indexes[result.traceback_link]
+        record = _result_record(result, traceback_index)
+        if result.traceback_link and \
+                result.traceback_link.result_link is not result:
+            # A repeat of a saved traceback, only its first result is
+            # kept in memory.
+            record["duplicate"] = True
+        row = len(self.results)
+        self.results.append(record)
+        self._index_result(row, result)
+
+    def summary_store(self):
+        # Results read back for the summary can't be marked as printed
+        # in the file so they are rebuilt in memory.
+        self.close()
+        store = ColumnarResultStore()
+        store.tracebacks = self.tracebacks
+        for result in self.results:
+            store.add_result(result)
+        return store
+
+    def close(self):
+        self.sink.close()
+
+
+class ResultRecords(object):
+    """Sequence of the results written to a JsonLinesResultSink by a
+    StreamingResultStore. Results are rebuilt from their records when
+    they are accessed.
+    """
+    def __init__(self, sink, tracebacks):
+        self.sink = sink
+        self.tracebacks = tracebacks
+        # Offset of each result record in the sink
+        self._offsets = array("l")
+
+    def append(self, record):
+        self._offsets.append(self.sink.write(record))
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def __iter__(self):
+        for record in self.sink.records():
+            yield _result_from_record(record, self.tracebacks)
+
+    def __getitem__(self, row):
+        return _result_from_record(self.sink.read(self._offsets[row]),
+                                   self.tracebacks)
+
+
+class JsonLinesResultSink(object):
+    """Append only file of saved result records, one JSON object per
+    line. Writes are buffered and flushed at least every flush_interval
+    seconds so the results saved before a crash are not lost.
+    """
+    def __init__(self, path, flush_interval=1.0):
+        # Only imported if results are written to a file
+        import json
+        self._json = json
+        self.path = path
+        self.flush_interval = flush_interval
+        self._file = open(path, "w")
+        self._reader = None
+        self._last_flush = _perf_counter()
+
+    def write(self, record):
+        """Write the record and return its offset in the file."""
+        offset = self._file.tell()
+        self._file.write(self._json.dumps(record, default=str))
+        self._file.write("\n")
+        now = _perf_counter()
+        if now - self._last_flush >= self.flush_interval:
+            self.flush()
+            self._last_flush = now
+        return offset
+
+    def flush(self):
+        if not self._file.closed:
+            self._file.flush()
+
+    def read(self, offset):
+        """Return the record written at offset."""
+        self.flush()
+        if self._reader is None:
+            self._reader = open(self.path)
+        self._reader.seek(offset)
+        return self._json.loads(self._reader.readline())
+
+    def records(self):
+        self.flush()
+        with open(self.path) as records_file:
+            for line in records_file:
+                yield self._json.loads(line)
+
+    def close(self):
+        self._file.close()
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
+
+
+# Result attributes saved in a result record
+RECORD_FIELDS = ("step", "msg", "status", "type_code", "class_name", "module",
+                 "phase", "scope", "test_function", "fixture_name", "worker",
+                 "raise_immediately", "printed", "source_function",
+                 "source_code", "timestamp", "duration")
+
+
+def _result_record(result, traceback_index=None):
+    # Return a JSON serializable record (dictionary) of a result.
+    record = dict((field, getattr(result, field)) for field in RECORD_FIELDS)
+    # The timestamp is relative to the start of the session of the
+    # process that saved the result (e.g. an xdist worker), the record
+    # holds the (monotonic) clock time, see _result_from_record.
+    record["timestamp"] += Timings.start
+    if isinstance(result.msg, LazyMessage):
+        record["msg"] = str(result.msg)
+    if isinstance(result.source_locals, dict):
+        record["source_locals"] = _locals_repr(result.source_locals)
+    else:
+        record["source_locals"] = result.source_locals
+    record["source_location"] = result._source_location
+    record["traceback"] = traceback_index
+    return record
+
+
+def _result_from_record(record, tracebacks, keep_raised=False):
+    # Return the Result of a record created by _result_record.
+    # The traceback is either an index of tracebacks or included in the
+    # record (see _traceback_from_record for keep_raised).
+    failure_traceback = None
+    if record["traceback"] is not None:
+        failure_traceback = tracebacks[record["traceback"]]
+        if not record.get("duplicate"):
+            return failure_traceback.result_link
+    result = Result.__new__(Result)
+    for field in RECORD_FIELDS:
+        value = record[field]
+        if isinstance(value, unicode):
+            # Decoded JSON strings are unicode, use str where possible
+            try:
+                value = value.encode("ascii")
+            except UnicodeEncodeError:
+                pass
+        setattr(result, field, _intern(value))
+    result.timestamp -= Timings.start
+    result.source_locals = record["source_locals"]
+    if record["source_location"]:
+        result._source_location = tuple(record["source_location"])
+    else:
+        result._source_location = None
+    result.traceback_link = failure_traceback
+    if record.get("traceback_record"):
+        result.traceback_link = _traceback_from_record(
+            record["traceback_record"], keep_raised)
+        result.traceback_link.result_link = result
+    return result
+
+
+def _traceback_record(failure_traceback):
+    # Return a serializable record (dictionary) of a FailureTraceback.
+    return {"exc_type": failure_traceback.exc_type.__name__,
+            "formatted_traceback": _render_traceback_locals(
+                failure_traceback.formatted_traceback),
+            "raised": failure_traceback.raised,
+            "occurrences": failure_traceback.occurrences}
+
+
+def _traceback_from_record(record, keep_raised=False):
+    # Return the FailureTraceback of a record created by
+    # _traceback_record. It can't be raised again unless keep_raised is
+    # set and it wasn't raised when the record was created.
+    failure_traceback = FailureTraceback(
+        _exception_type(record["exc_type"]), None,
+        record["formatted_traceback"],
+        raised=record["raised"] if keep_raised else True)
+    failure_traceback.occurrences = record.get("occurrences", 1)
+    return failure_traceback
+
+
+def _exception_type(name):
+    # Return the exception type with the specified name. The type of
+    # exceptions other than those raised by the plugin is only used for
+    # its name.
+    name = str(name)
+    if name not in _EXCEPTION_TYPES:
+        _EXCEPTION_TYPES[name] = type(name, (Exception,), {})
+    return _EXCEPTION_TYPES[name]
+
+
+class WorkerResultStore(ResultStore):
+    """ResultStore of a pytest-xdist worker. The results are kept as
+    records (with their tracebacks) until they are taken to be sent to
+    the controller, which collates the session summary.
+    """
+    def __init__(self):
+        super(WorkerResultStore, self).__init__()
+        self._records = []
+
+    def find_traceback(self, signature):
+        # Each traceback is sent with its result so they aren't shared
+        return None
+
+    def add_result(self, result):
+        record = _result_record(result)
+        if result.traceback_link:
+            record["traceback_record"] = _traceback_record(
+                result.traceback_link)
+        self._records.append(record)
+
+    def take_records(self):
+        """Return and clear the records of the results saved since the
+        records were last taken.
+        """
+        records = self._records
+        self._records = []
+        return records
+
+
+class ChildResultStore(WorkerResultStore):
+    """ResultStore of a forked child process of the test session (e.g. a
+    multiprocessing.Pool worker). The result records are written to a
+    file in the session's child results directory as they are saved
+    and the session merges them at the end of each phase. The file is
+    created when the process saves its first result.
+    """
+    def __init__(self, directory):
+        super(ChildResultStore, self).__init__()
+        self.directory = directory
+        self.sink = None
+        # Process that created the sink (a child of the child has its own)
+        self._pid = None
+
+    def add_result(self, result):
+        super(ChildResultStore, self).add_result(result)
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            import tempfile
+            handle, path = tempfile.mkstemp(
+                suffix=".jsonl", prefix="{}-".format(self._pid),
+                dir=self.directory)
+            os.close(handle)
+            # Flushed after each record, the process may exit without
+            # flushing its files
+            self.sink = JsonLinesResultSink(path, flush_interval=0)
+        for record in self.take_records():
+            self.sink.write(record)
+
+
 class Verifications:
     # Module level storage of verification results and tracebacks for
     # failures and warnings.
-    saved_tracebacks = []
-    saved_results = []
+    store = ResultStore()
+
+
+class ChildResults:
+    # Results saved by child processes of the session
+    directory = None  # Directory of the child result files
+    offsets = {}  # Child result file: offset of the records read
+    fork_hook = False  # _after_fork_in_child is registered
+
+
+def _start_child_results():
+    # Create the directory child processes write their results to.
+    # Forked children switch to a ChildResultStore (see
+    # _after_fork_in_child).
+    import tempfile
+    if not ChildResults.fork_hook:
+        _register_fork_hook()
+    ChildResults.directory = tempfile.mkdtemp(prefix="pytest_verify_")
+    ChildResults.offsets = {}
+
+
+def _register_fork_hook():
+    # Registered once, when the first session starts rather than when the
+    # plugin is imported.
+    if hasattr(os, "register_at_fork"):
+        os.register_at_fork(after_in_child=_after_fork_in_child)
+    else:
+        # python 2, multiprocessing children only
+        from multiprocessing.util import register_after_fork
+        register_after_fork(ChildResults, _after_fork_in_child)
+    ChildResults.fork_hook = True
+
+
+def _stop_child_results():
+    if ChildResults.directory:
+        _merge_child_results()
+        import shutil
+        shutil.rmtree(ChildResults.directory, ignore_errors=True)
+        ChildResults.directory = None
+
+
+def _after_fork_in_child(*args):
+    # Save the results of a forked child process of the session (or of
+    # one of its children) for the session to merge.
+    if ChildResults.directory:
+        Verifications.store = ChildResultStore(ChildResults.directory)
+        ChildResults.directory = None
+    elif not isinstance(Verifications.store, ChildResultStore):
+        # Not forked by a session
+        return
+    # The thread that forked (e.g. a Pool's handler thread) is the only
+    # thread of the child
+    SessionStatus.thread_id = _get_ident()
+    ThreadResults.buffers = []
+
+
+def _merge_child_results():
+    # Add the results written by child processes since they were last
+    # merged to the result store. Results saved in another test or phase
+    # (e.g. by a pool created in a fixture) are saved in the session's
+    # current context.
+    directory = ChildResults.directory
+    if not directory:
+        return
+    try:
+        paths = sorted(os.listdir(directory))
+    except OSError:
+        return
+    if not paths:
+        return
+    import json
+    store = Verifications.store
+    for path in paths:
+        path = os.path.join(directory, path)
+        offset = ChildResults.offsets.get(path, 0)
+        with open(path) as records_file:
+            records_file.seek(offset)
+            while True:
+                line = records_file.readline()
+                if not line.endswith("\n"):
+                    # End of file or a record not completely written
+                    break
+                offset += len(line)
+                result = _result_from_record(json.loads(line), None,
+                                             keep_raised=True)
+                if result.test_function != SessionStatus.test_function or \
+                        result.phase != SessionStatus.phase:
+                    result.module = _intern(SessionStatus.module)
+                    result.class_name = _intern(SessionStatus.class_name)
+                    result.test_function = _intern(
+                        SessionStatus.test_function)
+                    result.phase = _intern(SessionStatus.phase)
+                    result.step = _intern(
+                        pytest.redirect.get_current_l1_msg())
+                    result.scope = None
+                    result.fixture_name = None
+                if result.traceback_link:
+                    store.add_traceback(result.traceback_link)
+                store.add_result(result)
+        ChildResults.offsets[path] = offset
+
+
+
+class Timings:
+    # Durations (seconds) measured during the session with _perf_counter
+    start = _perf_counter()  # Start of the session (Result.timestamp 0)
+    # (scope, fixture name, phase): [count, total duration, max duration]
+    fixtures = OrderedDict()
+    # FixtureDef: start of its teardown (its finalizers)
+    fixture_starts = {}
+    # (test function, phase, step): total duration of the step
+    steps = OrderedDict()
+    # (test function, phase, step), start of the current step (None if
+    # there isn't one)
+    step = None
+    # The tests have finished, steps logged by the summary aren't timed
+    finished = False
+
+
+def _start_step(step, start):
+    # A new step was logged by the session thread at start.
+    _end_step(start)
+    if Timings.finished:
+        return
+    Timings.step = ((SessionStatus.test_function, SessionStatus.phase, step),
+                    start)
+
+
+def _end_step(end=None):
+    # End the current step (at the next step or the end of the phase).
+    if Timings.step is None:
+        return
+    key, start = Timings.step
+    Timings.step = None
+    if end is None:
+        end = _perf_counter()
+    Timings.steps[key] = Timings.steps.get(key, 0.0) + end - start
+
+
+def _print_slowest_timings(count, phase_durations):
+    # Print the count slowest fixtures (total of setup or teardown), test
+    # phases (pytest report durations) and steps.
+    import heapq
+    fixtures = heapq.nlargest(count, Timings.fixtures.iteritems(),
+                              key=lambda item: item[1][1])
+    if fixtures:
+        pytest.log.high_level_step("Slowest fixtures")
+    for (scope, fixture_name, phase), (runs, total, longest) in fixtures:
+        pytest.log.step("{:.3f}s {} {} {} ({} times, max {:.3f}s)".format(
+            total, phase, scope, fixture_name, runs, longest))
+    phases = heapq.nlargest(count, phase_durations)
+    if phases:
+        pytest.log.high_level_step("Slowest test phases")
+    for duration, test_function, phase in phases:
+        pytest.log.step("{:.3f}s {} {}".format(duration, phase,
+                                                test_function))
+    steps = heapq.nlargest(count, Timings.steps.iteritems(),
+                           key=lambda item: item[1])
+    if steps:
+        pytest.log.high_level_step("Slowest steps")
+    for (test_function, phase, step), duration in steps:
+        pytest.log.step("{:.3f}s {} {}: {}".format(duration, phase,
+                                                    test_function, step))
+
+
+class QuietPasses:
+    # Passing verifications counted but not yet logged (quiet-passes
+    # option).
+    step = None  # Step (top level message) of the counted verifications
+    count = 0
 
 
 class SessionStatus:
@@ -775,21 +1879,221 @@ class SessionStatus:
     # test function
     test_fixtures = OrderedDict()  # Test function: list of fixtures
     test_function = None  # Currently active setup or teardown fixture
+    test_workers = {}  # Test function: pytest-xdist worker that ran it
+    # Fixtures (FixtureDef) currently being setup or torn down, innermost
+    # last
+    fixture_stack = []
+    last_fixture = None  # Fixture most recently setup/torn down in phase
 
     module = None
     class_name = None
+    thread_id = None  # Thread running the session (pytest hooks)
+    # Current context published for other threads (see _publish_context)
+    context = None
+
+
+class VerifyContext(object):
+    """Test context that results saved by threads other than the session
+    thread are attributed to. Use as a context manager in the thread, or
+    bind a function to it, e.g. when work is submitted to a thread pool.
+    """
+    __slots__ = ("module", "class_name", "test_function", "phase",
+                 "fixture_name", "fixture_scope", "step", "expired",
+                 "_previous")
+
+    def __init__(self):
+        self.module = None
+        self.class_name = None
+        self.test_function = None
+        self.phase = None
+        self.fixture_name = None
+        self.fixture_scope = None
+        self.step = None
+        # Results saved in the context once it has expired are dropped
+        # (e.g. by checks abandoned by verify_concurrently)
+        self.expired = False
+        self._previous = None
+
+    @classmethod
+    def capture(cls):
+        """Return the current context of the session. Only call from the
+        session thread, other threads use the context published by the
+        session thread (see _publish_context).
+        """
+        context = cls()
+        context.module = SessionStatus.module
+        context.class_name = SessionStatus.class_name
+        context.test_function = SessionStatus.test_function
+        context.phase = SessionStatus.phase
+        if SessionStatus.phase != "call" and SessionStatus.fixture_stack:
+            context.fixture_name, context.fixture_scope = _fixture_info(
+                SessionStatus.fixture_stack[-1])
+        context.step = pytest.redirect.get_current_l1_msg()
+        return context
+
+    def __enter__(self):
+        self._previous = getattr(ThreadResults.local, "context", None)
+        ThreadResults.local.context = self
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        ThreadResults.local.context = self._previous
+        self._previous = None
+
+    def bind(self, function):
+        """Return function wrapped to run in this context."""
+        @functools.wraps(function)
+        def in_context(*args, **kwargs):
+            with self:
+                return function(*args, **kwargs)
+        return in_context
+
+
+class ThreadResultBuffer(object):
+    """Results, tracebacks and log messages saved by a thread other than
+    the session thread. They are added to the result store (and logged)
+    by the session thread at the end of each phase, see
+    _merge_thread_results. Implements the ResultStore methods used by
+    _save_result.
+    """
+    # Entry types
+    TRACEBACK = 0
+    RESULT = 1
+    LOG = 2
+    PASS = 3
+
+    def __init__(self):
+        self.thread = threading.current_thread()
+        # (sequence number, entry type, value, extra)
+        self.entries = deque()
+        # Stack signature: traceback not yet merged
+        self._by_signature = {}
+
+    def add_traceback(self, failure_traceback, signature=None):
+        self.entries.append((next(ThreadResults.sequence), self.TRACEBACK,
+                             failure_traceback, signature))
+        if signature is not None:
+            self._by_signature[signature] = failure_traceback
+
+    def find_traceback(self, signature):
+        return self._by_signature.get(signature)
+
+    def add_result(self, result):
+        self.entries.append((next(ThreadResults.sequence), self.RESULT,
+                             result, None))
+
+    def add_log(self, msg, log_level):
+        self.entries.append((next(ThreadResults.sequence), self.LOG, msg,
+                             log_level))
+
+    def add_quiet_pass(self):
+        self.entries.append((next(ThreadResults.sequence), self.PASS, None,
+                             None))
+
+    def take(self):
+        """Remove and return the entries saved so far."""
+        self._by_signature.clear()
+        entries = []
+        try:
+            while True:
+                entries.append(self.entries.popleft())
+        except IndexError:
+            pass
+        return entries
+
+
+class ThreadResults:
+    # Result buffers of the threads (other than the session thread) that
+    # have saved results.
+    buffers = []
+    lock = threading.Lock()  # Held to add/remove buffers
+    local = threading.local()  # buffer and context of each thread
+    sequence = itertools.count()  # Order the results were saved in
+
+
+def _thread_buffer():
+    # Return the result buffer of the current thread, None for the
+    # session thread.
+    if SessionStatus.thread_id is None or \
+            _get_ident() == SessionStatus.thread_id:
+        return None
+    try:
+        return ThreadResults.local.buffer
+    except AttributeError:
+        buffer = ThreadResults.local.buffer = ThreadResultBuffer()
+        with ThreadResults.lock:
+            ThreadResults.buffers.append(buffer)
+        return buffer
+
+
+def _thread_context():
+    # Return the context of results saved by the current (non session)
+    # thread.
+    context = getattr(ThreadResults.local, "context", None)
+    if context is None:
+        # Not bound to a context, use the session's current context
+        context = SessionStatus.context
+    return context
+
+
+def _publish_context():
+    # Publish the session's current context for the results of threads
+    # not bound to a context. Called by the session thread each time the
+    # context changes, other threads only read the published context
+    # (the session status is changed by the session thread as they
+    # read it).
+    SessionStatus.context = VerifyContext.capture()
+
+
+def _merge_thread_results():
+    # Add the results saved by other threads to the result store, in the
+    # order they were saved, and log their messages.
+    with ThreadResults.lock:
+        buffers = list(ThreadResults.buffers)
+    entries = []
+    for buffer in buffers:
+        entries.extend(buffer.take())
+        if not buffer.thread.is_alive() and not buffer.entries:
+            with ThreadResults.lock:
+                ThreadResults.buffers.remove(buffer)
+    if not entries:
+        return
+    entries.sort(key=lambda entry: entry[0])
+    store = Verifications.store
+    for _, entry_type, value, extra in entries:
+        if entry_type == ThreadResultBuffer.TRACEBACK:
+            store.add_traceback(value, extra)
+        elif entry_type == ThreadResultBuffer.RESULT:
+            store.add_result(value)
+        elif entry_type == ThreadResultBuffer.PASS:
+            QuietPasses.count += 1
+        else:
+            _log_quiet_passes()
+            _log_verify_step(value, extra)
 
 
 class Result(object):
     """Object used to save a result of the verify function or
     any other caught exceptions.
     """
+    __slots__ = ("step", "msg", "status", "type_code", "source_function",
+                 "source_code", "source_locals", "_source_location",
+                 "traceback_link", "raise_immediately", "class_name",
+                 "module", "phase", "scope", "test_function", "fixture_name",
+                 "worker", "printed", "timestamp", "duration")
+
     def __init__(self, message, status, type_code, scope,
                  fixture_name, source_function, source_code, raise_immediately,
                  source_locals=None, traceback_index=None,
-                 fail_traceback_link=None):
+                 fail_traceback_link=None, source_location=None,
+                 context=None, duration=None):
         # Basic result information
-        self.step = pytest.redirect.get_current_l1_msg()
+        if context is None:
+            # Saved by the session thread in the current context
+            context = SessionStatus
+            self.step = _intern(pytest.redirect.get_current_l1_msg())
+        else:
+            self.step = _intern(context.step)
         self.msg = message
         self.status = status
 
@@ -798,57 +2102,117 @@ class Result(object):
         # "P": pass, "W": WarningException, "F": VerificationException
         # "A": AssertionError, "O": any Other exception
         self.type_code = type_code
-        self.source = {
-            "module-function-line": source_function,
-            "code": source_code,
-            "locals": source_locals
-        }
+        self.source_function = source_function
+        self.source_code = source_code
+        self.source_locals = source_locals
+        # (filename, line number, function name) of the call to verify
+        # for results saved without source (passing verifications).
+        self._source_location = source_location
         # Link to the saved traceback object for failures
         self.traceback_link = fail_traceback_link
         self.raise_immediately = raise_immediately
 
         # Information about source of the result
-        self.class_name = SessionStatus.class_name
-        self.module = SessionStatus.module
-        self.phase = SessionStatus.phase
-        self.scope = scope
-        self.test_function = SessionStatus.test_function
-        self.fixture_name = fixture_name
+        self.class_name = _intern(context.class_name)
+        self.module = _intern(context.module)
+        self.phase = _intern(context.phase)
+        self.scope = _intern(scope)
+        self.test_function = _intern(context.test_function)
+        self.fixture_name = _intern(fixture_name)
+        # pytest-xdist worker that saved the result (set by controller)
+        self.worker = None
 
         # Additional attributes for keeping track of the result
         self.printed = False
 
-    def formatted_dict(self):
-        f = OrderedDict()
-        f["Step"] = self.step
-        f["Message"] = self.msg
-        f["Status"] = self.status
-        if DEBUG["summary"]:
-            f["Class"] = self.class_name
-            f["Module"] = self.module
-            f["Phase"] = self.phase
-            f["Scope"] = self.scope
-            f["Fixture Name"] = self.fixture_name
-            f["Test Function"] = self.test_function
-            f["ID"] = hex(id(self))[-4:]
-            f["Tb ID"] = hex(id(self.traceback_link))[-4:] if \
-                self.traceback_link else None
+        # Time the result was saved (seconds since the session started)
+        # and the duration of the verification (None if not measured)
+        self.timestamp = _perf_counter() - Timings.start
+        self.duration = duration
+
+    @property
+    def source(self):
+        """Source of the call to verify. Deferred for results saved with
+        only a code location until it is first accessed.
+        """
+        if self._source_location:
+            filename, line_number, function = self._source_location
+            self.source_function = "{}:{}:{}".format(filename, line_number,
+                                                     function)
+            self.source_code = _SOURCE_CACHE.call_source(filename,
+                                                         line_number)
+            self._source_location = None
+        return {
+            "module-function-line": self.source_function,
+            "code": self.source_code,
+            "locals": self.source_locals
+        }
+
+    # Columns of the saved results table
+    TABLE_COLUMNS = ("Step", "Message", "Status", "Time", "Duration")
+    DEBUG_TABLE_COLUMNS = ("Class", "Module", "Phase", "Scope",
+                           "Fixture Name", "Test Function", "ID", "Tb ID",
+                           "Extra")
+
+    @classmethod
+    def table_columns(cls):
+        if DEBUG["summary"].enabled:
+            return cls.TABLE_COLUMNS + cls.DEBUG_TABLE_COLUMNS
+        return cls.TABLE_COLUMNS
+
+    def table_values(self):
+        """Return the values of the table_columns for this result."""
+        values = [self.step, self.msg, self.status,
+                  _format_seconds(self.timestamp),
+                  _format_seconds(self.duration)]
+        if DEBUG["summary"].enabled:
             if self.traceback_link:
+                tb_id = hex(id(self.traceback_link))[-4:]
                 raised = "Y" if self.traceback_link.raised else "N"
             else:
+                tb_id = None
                 raised = "-"
             e = "{}.{}.{}.{}".format(self.type_code,
                                      "Y" if self.raise_immediately else "N",
                                      "Y" if self.printed else "N",
                                      raised)
-            f["Extra"] = e
-        return f
+            values.extend((self.class_name, self.module, self.phase,
+                           self.scope, self.fixture_name, self.test_function,
+                           hex(id(self))[-4:], tb_id, e))
+        return values
+
+    def formatted_dict(self):
+        return OrderedDict(zip(self.table_columns(), self.table_values()))
+
+
+class ColumnResult(Result):
+    """Result rebuilt from ResultColumns. Its printed flag is kept in
+    the columns so it is not lost when the object is released.
+    """
+    __slots__ = ("_columns", "_row", "__weakref__")
+
+    @property
+    def printed(self):
+        return bool(self._columns._flags[self._row] & ResultColumns.PRINTED)
+
+    @printed.setter
+    def printed(self, printed):
+        self._columns.set_printed(self._row, printed)
+
+
+def _format_seconds(seconds):
+    if seconds is None:
+        return "-"
+    return "{:.3f}".format(seconds)
 
 
 class FailureTraceback(object):
     """Object used to store the traceback information for a failure or
     warning result.
     """
+    __slots__ = ("exc_type", "exc_traceback", "formatted_traceback",
+                 "raised", "result_link", "occurrences", "exception")
+
     def __init__(self, exc_type, exc_traceback, formatted_traceback,
                  raised=False):
         self.exc_type = exc_type
@@ -857,7 +2221,13 @@ class FailureTraceback(object):
         # (not where the exception is caught an re-raised).
         self.formatted_traceback = formatted_traceback
         self.raised = raised
+        # First result saved with this traceback
         self.result_link = None
+        # Number of results saved with this traceback (identical stacks)
+        self.occurrences = 1
+        # Exception raised for the result by a thread other than the
+        # session thread (see _set_raised_by_thread)
+        self.exception = None
 
 
 def _log_verification(msg, log_level):
@@ -874,67 +2244,636 @@ def _log_verification(msg, log_level):
 
 def _verify(fail_condition, fail_message, raise_immediately, warning,
             warn_condition, warn_message, full_method_trace,
-            stop_at_test, log_level):
+            stop_at_test, log_level, started=None, caller_depth=2,
+            duration=None):
     """Perform a verification of a given condition using the parameters
-    provided.
+    provided. The duration of the verification is measured from started
+    (default: now) unless it is given (duration). The source of the saved
+    result is the function caller_depth frames up the stack (the caller of
+    verify).
     """
+    if started is None:
+        started = _perf_counter()
     if warning:
         raise_immediately = False
 
-    _debug_print("Performing verification", DEBUG["verify"])
-    _debug_print("Locals: {}".format(inspect.getargvalues(inspect.stack()[1][0]).locals),
-                 DEBUG["verify"])
-
-    def warning_init():
-        _debug_print("WARNING (fail_condition)", DEBUG["verify"])
-        try:
-            raise WarningException()
-        except WarningException:
-            traceback = sys.exc_info()[2]
-        return "WARNING", WarningException, traceback
-
-    def failure_init():
-        try:
-            raise VerificationException()
-        except VerificationException:
-            traceback = sys.exc_info()[2]
-        return "FAIL", VerificationException, traceback
-
-    def pass_init():
-        return "PASS", None, None
+    if DEBUG["verify"].enabled:
+        # Avoid inspecting the stack unless debugging
+        _debug_print("Performing verification", DEBUG["verify"])
+        _debug_print("Locals: {}", DEBUG["verify"],
+                     inspect.getargvalues(sys._getframe(1)).locals)
 
+    # The exceptions are only created when they are raised. Saved
+    # results that are raised later (see _raise_first_saved_exc_type) are
+    # raised without the traceback of the call to verify, which is saved
+    # (formatted) with the result.
     if not fail_condition:
         msg = fail_message
         if warning:
-            status, exc_type, exc_tb = warning_init()
-        else:
-            status, exc_type, exc_tb = failure_init()
-    elif warn_condition is not None:
-        if not warn_condition:
-            status, exc_type, exc_tb = warning_init()
-            msg = warn_message
+            _debug_print("WARNING (fail_condition)", DEBUG["verify"])
+            status, exc_type = "WARNING", WarningException
         else:
-            # Passed
-            status, exc_type, exc_tb = pass_init()
-            msg = fail_message
+            status, exc_type = "FAIL", VerificationException
+    elif warn_condition is not None and not warn_condition:
+        status, exc_type = "WARNING", WarningException
+        msg = warn_message
     else:
         # Passed
-        status, exc_type, exc_tb = pass_init()
+        status, exc_type = "PASS", None
         msg = fail_message
+    if exc_type is not None and isinstance(msg, LazyMessage):
+        # Failure and warning messages are formatted when they are saved,
+        # the arguments may be changed later in the test. Only passing
+        # messages are formatted if and when they are required.
+        msg = str(msg)
+
+    # Results of other threads are buffered and logged by the session
+    # thread
+    buffer = _thread_buffer()
+    if buffer is not None and _thread_context().expired:
+        # The thread's work has been abandoned, e.g. a verify_concurrently
+        # check still running at the timeout
+        if not fail_condition and raise_immediately:
+            raise exc_type(str(msg))
+        return True
+    if status == "PASS" and CONFIG["quiet-passes"].value:
+        if buffer is None:
+            _count_quiet_pass()
+        else:
+            buffer.add_quiet_pass()
+    elif buffer is None:
+        # Log the passes counted before this result first
+        _log_quiet_passes()
+        _log_verify_step("{} - {}".format(msg, status), log_level)
+    else:
+        buffer.add_log("{} - {}".format(msg, status), log_level)
+    raising = not fail_condition and raise_immediately
+    if duration is None:
+        duration = _perf_counter() - started
+    failure_traceback = _save_result(msg, status, exc_type, stop_at_test,
+                                     full_method_trace, raise_immediately,
+                                     buffer, duration, caller_depth + 1,
+                                     raising and buffer is None)
+
+    if raising:
+        # Raise immediately. Results saved by other threads are not set
+        # as raised, the session thread raises them at the end of the
+        # phase unless this exception is raised by the test first.
+        exception = exc_type(str(msg))
+        if buffer is None:
+            _set_saved_raised()
+        elif failure_traceback.exception is None:
+            failure_traceback.exception = exception
+        raise exception
+    return True
+
 
+def _verify_for_caller(fail_condition, fail_message, raise_immediately,
+                       warning, warn_condition, warn_message,
+                       full_method_trace, stop_at_test, log_level,
+                       started=None, duration=None):
+    # _verify for the plugin's verify_... functions, the source of the
+    # saved result is the test that called the verify_... function (not
+    # the function itself).
+    _verify(fail_condition, fail_message, raise_immediately, warning,
+            warn_condition, warn_message, full_method_trace, stop_at_test,
+            log_level, started, 3, duration)
+
+
+def _verify_samples(failures, warnings, total, fail_message,
+                    raise_immediately, warning, warn_message,
+                    full_method_trace, stop_at_test, log_level):
+    # Save the result of a check of total elements from the elements that
+    # failed it (and the warn condition), see FailureSamples.
+    _verify(not failures.count, failures.describe(fail_message, total),
+            raise_immediately, warning,
+            None if warnings is None else not warnings.count,
+            None if warnings is None else
+            warnings.describe(warn_message, total),
+            full_method_trace, stop_at_test, log_level, caller_depth=3)
+
+
+class LazyMessage(object):
+    """Verification message evaluated each time its text is required:
+    a format template and its arguments or a callable that returns the
+    text (only called once).
+    """
+    __slots__ = ("template", "args")
+
+    def __init__(self, template, args=()):
+        self.template = _intern(template)
+        self.args = args
+
+    def __str__(self):
+        if callable(self.template):
+            self.template = str(self.template())
+            self.args = ()
+        if not self.args:
+            return self.template
+        return self.template.format(*self.args)
+
+    def __repr__(self):
+        return repr(str(self))
+
+
+def _lazy_message(message, args):
+    # Return a verification message (template) that is evaluated when it
+    # is first required.
+    if args is not None:
+        if not isinstance(args, tuple):
+            args = (args,)
+        return LazyMessage(message, args)
+    if callable(message):
+        return LazyMessage(message)
+    return message
+
+
+def _log_verify_step(msg, log_level):
+    # Log a verification message, by default one level below a top level
+    # step.
     if not log_level and pytest.redirect.get_current_level() == 1:
         verify_msg_log_level = 2
     else:
         verify_msg_log_level = log_level
-    pytest.log.step("{} - {}".format(msg, status), verify_msg_log_level)
-    _save_result(msg, status, exc_type, exc_tb, stop_at_test,
-                 full_method_trace, raise_immediately)
+    pytest.log.step(msg, verify_msg_log_level)
+
+
+def _count_quiet_pass():
+    # Count a passing verification (quiet-passes option). The count of
+    # the previous step is logged when a new step is logged (see
+    # _step_function) or, if the step was changed some other way, here.
+    step = pytest.redirect.get_current_l1_msg()
+    if step != QuietPasses.step:
+        _log_quiet_passes()
+        if Timings.step is not None and Timings.step[0][2] != step:
+            _start_step(step, _perf_counter())
+        QuietPasses.step = step
+    QuietPasses.count += 1
+
+
+def _step_function(function, starts_step):
+    # Wrap a pytest.log function so the passes counted (quiet-passes
+    # option) are logged before it starts a new step, the step is timed
+    # and published to other threads. starts_step(args, kwargs) returns True
+    # if a call starts a new step.
+    @functools.wraps(function)
+    def step_function(*args, **kwargs):
+        if _get_ident() != SessionStatus.thread_id or \
+                not starts_step(args, kwargs):
+            return function(*args, **kwargs)
+        _log_quiet_passes()
+        start = _perf_counter()
+        value = function(*args, **kwargs)
+        _start_step(pytest.redirect.get_current_l1_msg(), start)
+        _publish_context()
+        return value
+    step_function.starts_step = True
+    return step_function
+
+
+def _is_top_level_step(args, kwargs):
+    # Return True if pytest.log.step(msg, log_level) logs a top level
+    # step.
+    log_level = kwargs.get("log_level", args[1] if len(args) > 1 else None)
+    return log_level == 1
+
+
+def _log_quiet_passes():
+    # Log the count of the passing verifications not yet logged
+    # (quiet-passes option).
+    if QuietPasses.count:
+        count = QuietPasses.count
+        QuietPasses.count = 0
+        _log_verify_step("{} checks passed".format(count), None)
+
+
+class FailureSamples(object):
+    """Count of the elements that failed a check with a sample of the
+    first failing elements (index and text) and, if value_range is set,
+    the range of the failing values. Checking stops once max_failures
+    elements have failed (if set).
+    """
+    def __init__(self, max_samples, max_failures=None, value_range=False):
+        self.max_samples = max_samples
+        self.max_failures = max_failures
+        self.value_range = value_range
+        self.count = 0
+        self.samples = []
+        self.min = None
+        self.max = None
+
+    def add(self, index, value):
+        self.count += 1
+        if len(self.samples) < self.max_samples:
+            # The text is kept, the element may be changed or consumed
+            self.samples.append((index, _LOCALS_REPR.repr(value)))
+        if not self.value_range:
+            return
+        if self.count == 1:
+            self.min = self.max = value
+        elif value < self.min:
+            self.min = value
+        elif value > self.max:
+            self.max = value
+
+    def add_mask(self, flat_values, failing):
+        # Add the failing elements of a numpy array from a boolean mask
+        # of the same (flat) shape.
+        self.count = int(numpy.count_nonzero(failing))
+        if self.count:
+            indices = numpy.flatnonzero(failing)[:self.max_samples]
+            self.samples = [
+                (index, _LOCALS_REPR.repr(value)) for index, value in
+                zip(indices.tolist(), flat_values[indices].tolist())]
+            if self.value_range and flat_values.dtype.kind in "biuf":
+                # Numeric values only (numpy can't reduce strings)
+                failing_values = flat_values[failing]
+                self.min = failing_values.min()
+                self.max = failing_values.max()
+
+    def limit_reached(self):
+        return self.max_failures is not None and \
+            self.count >= self.max_failures
+
+    def describe(self, msg, total):
+        if not self.count:
+            # Only built if it is required, as for a pass of verify
+            return LazyMessage("{} ({}/{} passed)", (msg, total, total))
+        more = ", ..." if self.count > len(self.samples) else ""
+        stopped = ", stopped at failure limit" if self.limit_reached() \
+            else ""
+        value_range = ""
+        if self.value_range and self.min is not None:
+            value_range = ", failing values min {} max {}".format(self.min,
+                                                                  self.max)
+        return "{} ({}/{} failed{}, e.g. [{}{}]{})".format(
+            msg, self.count, total, stopped,
+            ", ".join("{}: {}".format(i, v) for i, v in self.samples), more,
+            value_range)
+
+
+# array.array typecode: numpy dtype of the same C type. Unicode arrays
+# ("u") are converted element by element, the size of their elements
+# depends on the python build.
+_ARRAY_DTYPES = {"c": "S1", "b": "b", "B": "B", "h": "h", "H": "H",
+                 "i": "i", "I": "I", "l": "l", "L": "L", "f": "f", "d": "d"}
+
+
+def _import_numpy():
+    # Import numpy when it is first required (it is slow to import).
+    # Returns None if numpy is not installed.
+    global numpy
+    if numpy is False:
+        try:
+            import numpy
+        except ImportError:
+            # verify_array falls back to checking each element
+            numpy = None
+    return numpy
+
+
+def _check_array(values, condition, warn_condition, max_indices):
+    # Test condition (and warn_condition where condition passes) for
+    # every element of values. With numpy each condition is evaluated
+    # once over the whole array so it must be vectorised (e.g. a lambda
+    # using comparison/arithmetic operators), otherwise it is called
+    # for each element.
+    # Returns (failures, warnings or None, number of elements).
+    failures = FailureSamples(max_indices, value_range=True)
+    warnings = None if warn_condition is None else \
+        FailureSamples(max_indices, value_range=True)
+    if _import_numpy() is not None:
+        if isinstance(values, array) and values.typecode in _ARRAY_DTYPES:
+            flat_values = numpy.frombuffer(
+                values, dtype=_ARRAY_DTYPES[values.typecode])
+        else:
+            flat_values = numpy.asarray(values).ravel()
+        passing = numpy.asarray(condition(flat_values), dtype=bool)
+        if passing.shape != flat_values.shape:
+            raise ValueError("verify_array condition must return a result "
+                             "for each element")
+        failures.add_mask(flat_values, ~passing)
+        if warnings is not None:
+            warnings.add_mask(flat_values, passing & ~numpy.asarray(
+                warn_condition(flat_values), dtype=bool))
+        return failures, warnings, flat_values.size
+
+    try:
+        iter(values)
+    except TypeError:
+        # Any other (byte) buffer
+        values = memoryview(values).tolist()
+    total = 0
+    for index, value in enumerate(values):
+        total += 1
+        if not condition(value):
+            failures.add(index, value)
+        elif warnings is not None and not warn_condition(value):
+            warnings.add(index, value)
+    return failures, warnings, total
+
+
+def _check_each(iterable, predicate, warn_predicate, max_failures,
+                max_samples):
+    # Test predicate (and warn_predicate where predicate passes) for
+    # each element of iterable, stopping after max_failures failures.
+    # Only the counts and a sample of the failing elements are kept.
+    # Returns (failures, warnings or None, number of elements checked).
+    failures = FailureSamples(max_samples, max_failures)
+    warnings = None if warn_predicate is None else \
+        FailureSamples(max_samples)
+    total = 0
+    for index, value in enumerate(iterable):
+        total += 1
+        if not predicate(value):
+            failures.add(index, value)
+            if failures.limit_reached():
+                break
+        elif warnings is not None and not warn_predicate(value):
+            warnings.add(index, value)
+    return failures, warnings, total
 
-    if not fail_condition and raise_immediately:
-        # Raise immediately
-        _set_saved_raised()
-        raise_(exc_type, msg, exc_tb)
-    return True
+
+class EventualCheck(object):
+    """Condition checked repeatedly until it is met or a timeout expires.
+    poll() yields the delay before each further attempt so the caller
+    decides how to wait (e.g. time.sleep or an event loop timer), and
+    counts the attempts and the time elapsed.
+    """
+    __slots__ = ("condition_fn", "timeout", "interval", "backoff",
+                 "max_interval", "attempts", "elapsed", "passed")
+
+    def __init__(self, condition_fn, timeout, interval, backoff=1.0,
+                 max_interval=None):
+        self.condition_fn = condition_fn
+        self.timeout = timeout
+        self.interval = interval
+        self.backoff = backoff
+        self.max_interval = max_interval
+        self.attempts = 0
+        self.elapsed = 0.0
+        self.passed = False
+
+    def poll(self):
+        start = _perf_counter()
+        interval = self.interval
+        while True:
+            self.attempts += 1
+            self.passed = bool(self.condition_fn())
+            self.elapsed = _perf_counter() - start
+            remaining = self.timeout - self.elapsed
+            if self.passed or remaining <= 0:
+                return
+            # The condition is checked a final time at the timeout
+            yield min(interval, remaining)
+            interval *= self.backoff
+            if self.max_interval is not None:
+                interval = min(interval, self.max_interval)
+
+    def describe(self, msg):
+        # The message is only built if it is required
+        return LazyMessage(lambda: "{} ({} after {} attempt{} in {:.2f}s)"
+                           .format(msg, "met" if self.passed else "not met",
+                                   self.attempts,
+                                   "" if self.attempts == 1 else "s",
+                                   self.elapsed))
+
+
+class BatchCheck(object):
+    """Check run by verify_concurrently. The outcome (passed, exception
+    raised, latency in seconds) is set when the check completes.
+    """
+    __slots__ = ("name", "check_fn", "outcome")
+
+    def __init__(self, name, check_fn):
+        self.name = name
+        self.check_fn = check_fn
+        self.outcome = None
+
+    def run(self):
+        start = _perf_counter()
+        passed = False
+        error = None
+        try:
+            passed = bool(self.check_fn())
+        except Exception as e:
+            error = e
+        # Set once so the session thread sees a complete outcome
+        self.outcome = (passed, error, _perf_counter() - start)
+
+    def describe(self, msg, outcome):
+        # The message is only built if it is required
+        def build():
+            if outcome is None:
+                result = "did not complete"
+            elif outcome[1] is not None:
+                result = "raised {!r} in {:.3f}s".format(outcome[1],
+                                                        outcome[2])
+            else:
+                result = "{} in {:.3f}s".format(
+                    "passed" if outcome[0] else "failed", outcome[2])
+            return "{} [{}] ({})".format(msg, self.name, result)
+        return LazyMessage(build)
+
+
+def _describe_batch(msg, outcomes, elapsed):
+    # Summary of the outcomes of verify_concurrently's checks
+    def build():
+        latencies = sorted(outcome[2] for outcome in outcomes
+                           if outcome is not None)
+        failed = sum(1 for outcome in outcomes
+                     if outcome is None or not outcome[0])
+        incomplete = outcomes.count(None)
+        summary = "{}/{} failed".format(failed, len(outcomes))
+        if incomplete:
+            summary += " ({} did not complete)".format(incomplete)
+        summary += " in {:.2f}s".format(elapsed)
+        if latencies:
+            summary += ", latency median {:.3f}s max {:.3f}s".format(
+                latencies[len(latencies) // 2], latencies[-1])
+        return "{} ({})".format(msg, summary)
+    return LazyMessage(build)
+
+
+def _run_concurrently(checks, max_workers, timeout, context):
+    # Run the checks on up to max_workers daemon threads in context,
+    # waiting up to timeout seconds (None: no limit) for them to
+    # complete. Checks still running at the timeout are abandoned.
+    pending = deque(checks)
+    remaining = [len(checks)]
+    finished = threading.Condition()
+
+    def worker():
+        with context:
+            while True:
+                try:
+                    check = pending.popleft()
+                except IndexError:
+                    return
+                check.run()
+                with finished:
+                    remaining[0] -= 1
+                    if not remaining[0]:
+                        finished.notify()
+
+    for _ in range(min(max_workers, len(checks))):
+        thread = threading.Thread(target=worker, name="verify_concurrently")
+        thread.daemon = True
+        thread.start()
+    deadline = None if timeout is None else _perf_counter() + timeout
+    with finished:
+        while remaining[0]:
+            wait = 1.0 if deadline is None else deadline - _perf_counter()
+            if wait <= 0:
+                break
+            # Wait with a timeout so a KeyboardInterrupt is not delayed
+            finished.wait(min(wait, 1.0))
+    # Checks not started by the timeout are not run
+    pending.clear()
+
+
+class SourceFile(object):
+    """Source lines of a file with the first line of the statement that
+    each line belongs to (parsed once with tokenize) and the source of
+    the functions (code objects) found in the file.
+    """
+    __slots__ = ("mtime", "lines", "statement_starts", "functions",
+                 "call_sources")
+
+    def __init__(self, mtime, lines):
+        self.mtime = mtime
+        self.lines = lines
+        # Line number: first line number of its statement (0 if unknown)
+        self.statement_starts = _statement_starts(lines)
+        # Code object: (source lines, first line number) or None
+        self.functions = {}
+        # Line number: formatted source of the call on that line
+        self.call_sources = {}
+
+    def line(self, line_number):
+        if 0 < line_number <= len(self.lines):
+            return self.lines[line_number - 1]
+        return None
+
+    def call_source(self, line_number):
+        """Return the source of the statement ending at line_number
+        formatted for a traceback (the line itself marked with ">").
+        None if the statement could not be found.
+        """
+        try:
+            return self.call_sources[line_number]
+        except KeyError:
+            pass
+        call_source = None
+        if line_number < len(self.statement_starts) and \
+                self.statement_starts[line_number]:
+            start = max(self.statement_starts[line_number],
+                        line_number - MAX_CALL_SOURCE_LINES + 1)
+            call_source = [line.rstrip("\r\n") for line in
+                           self.lines[start - 1:line_number - 1]]
+            call_source.append(">{}".format(
+                self.lines[line_number - 1].rstrip("\r\n")[1:]))
+        self.call_sources[line_number] = call_source
+        return call_source
+
+
+class SourceCache(object):
+    """Least recently used cache of parsed source files (SourceFile).
+    Files are parsed again if they are modified.
+    """
+    def __init__(self, size=SOURCE_CACHE_SIZE):
+        self.size = size
+        self._files = OrderedDict()
+        # Held to update _files (verify may be called by any thread)
+        self._lock = threading.Lock()
+
+    def source_file(self, filename, module_globals=None):
+        try:
+            mtime = os.stat(filename).st_mtime
+        except (OSError, TypeError):
+            # Not a file, e.g. source from a zip import or <string>
+            mtime = None
+        with self._lock:
+            source_file = self._files.pop(filename, None)
+            if source_file is None or source_file.mtime != mtime:
+                linecache.checkcache(filename)
+                source_file = SourceFile(mtime, linecache.getlines(
+                    filename, module_globals))
+                if len(self._files) >= self.size:
+                    self._files.popitem(last=False)
+            self._files[filename] = source_file
+        return source_file
+
+    def function_source(self, code):
+        """Return the source lines and first line number of a code
+        object (as inspect.getsourcelines). Raises IOError if the source
+        is not available.
+        """
+        source_file = self.source_file(code.co_filename)
+        try:
+            source = source_file.functions[code]
+        except KeyError:
+            try:
+                source = inspect.getsourcelines(code)
+            except (IOError, TypeError):
+                source = None
+            source_file.functions[code] = source
+        if source is None:
+            raise IOError("could not get source code for {}".format(
+                code.co_name))
+        return source
+
+    def call_source(self, filename, line_number):
+        """Return the formatted source of the call on line_number (see
+        SourceFile.call_source).
+        """
+        return self.source_file(filename).call_source(line_number)
+
+    def clear(self):
+        with self._lock:
+            self._files.clear()
+
+
+_SOURCE_CACHE = SourceCache()
+
+
+def _statement_starts(lines):
+    # Return an array of the first line number of the statement each
+    # line (by line number) belongs to, 0 for lines that aren't part of
+    # a statement or couldn't be tokenized.
+    import tokenize
+    starts = array("i", [0]) * (len(lines) + 1)
+    start = None
+    try:
+        for token_type, _, token_start, token_end, _ in \
+                tokenize.generate_tokens(
+                    functools.partial(next, iter(lines), "")):
+            if token_type == tokenize.NEWLINE:
+                if start is not None:
+                    for line_number in xrange(start, token_end[0] + 1):
+                        starts[line_number] = start
+                start = None
+            elif start is None and token_type not in (
+                    tokenize.NL, tokenize.COMMENT, tokenize.INDENT,
+                    tokenize.DEDENT, tokenize.ENDMARKER):
+                start = token_start[0]
+    except (tokenize.TokenError, SyntaxError) as e:
+        _debug_print("Failed to tokenize source: {}", DEBUG["verify"], e)
+    return starts
+
+
+def _stack(frame, limit):
+    # Equivalent of inspect.stack() for up to limit frames (starting at
+    # frame) with the code context read from the source cache.
+    stack = []
+    while frame is not None and len(stack) < limit:
+        code = frame.f_code
+        line = _SOURCE_CACHE.source_file(
+            code.co_filename, frame.f_globals).line(frame.f_lineno)
+        stack.append((frame, code.co_filename, frame.f_lineno, code.co_name,
+                      [line] if line is not None else None, 0))
+        frame = frame.f_back
+    return stack
 
 
 def _get_complete_traceback(stack, start_depth, stop_at_test,
@@ -942,8 +2881,7 @@ def _get_complete_traceback(stack, start_depth, stop_at_test,
     # Print call lines or source code back to beginning of each calling
     # function (fullMethodTrace).
     if len(stack) > MAX_TRACEBACK_DEPTH:
-        _debug_print("Length of stack = {}".format(len(stack)),
-                     DEBUG["verify"])
+        _debug_print("Length of stack = {}", DEBUG["verify"], len(stack))
         max_traceback_depth = MAX_TRACEBACK_DEPTH
     else:
         max_traceback_depth = len(stack)
@@ -966,9 +2904,9 @@ def _get_complete_traceback(stack, start_depth, stop_at_test,
 def _get_calling_func(stack, depth, stop_at_test, full_method_trace):
     calling_source = []
     try:
-        func_source = inspect.getsourcelines(stack[depth][0])
+        func_source = _SOURCE_CACHE.function_source(stack[depth][0].f_code)
     except Exception as e:
-        _debug_print("{}".format(str(e)), DEBUG["verify"])
+        _debug_print("{}", DEBUG["verify"], e)
         return
     else:
         func_line_number = func_source[1]
@@ -977,16 +2915,8 @@ def _get_calling_func(stack, depth, stop_at_test, full_method_trace):
             return
         call_line_number = stack[depth][2]
         module_line_parent = "{0[1]}:{0[2]}:{0[3]}".format(stack[depth])
-        calling_frame_locals = ""
-        if CONFIG["include-verify-local-vars"].value\
-                or CONFIG["include-all-local-vars"].value:
-            try:
-                calling_frame_locals = dict(inspect.getargvalues(stack[depth]
-                                            [0]).locals.items())
-            except Exception as e:
-                pytest.log.step("Failed to retrieve local variables for {}".
-                                format(module_line_parent), log_level=5)
-                _debug_print("{}".format(str(e)), DEBUG["verify"])
+        calling_frame_locals = _frame_locals(stack[depth][0],
+                                             module_line_parent)
         if full_method_trace:
             for lineNumber in range(0, call_line_number - func_line_number):
                 source_line = re.sub('[\r\n]', '', func_source[0][lineNumber])
@@ -995,13 +2925,43 @@ def _get_calling_func(stack, depth, stop_at_test, full_method_trace):
                 call_line_number-func_line_number][1:])
             calling_source.append(">{}".format(source_line))
         else:
-            calling_source = _get_call_source(func_source,
-                                              func_call_source_line,
-                                              call_line_number,
-                                              func_line_number)
+            calling_source = _SOURCE_CACHE.call_source(stack[depth][1],
+                                                       call_line_number)
+            if calling_source is None:
+                calling_source = _get_call_source(func_source,
+                                                  func_call_source_line,
+                                                  call_line_number,
+                                                  func_line_number)
         return module_line_parent, calling_frame_locals, calling_source
 
 
+def _frame_locals(frame, module_line_parent):
+    # Return a copy of the local variables of a frame if they are
+    # included in tracebacks, otherwise "".
+    calling_frame_locals = ""
+    if CONFIG["include-verify-local-vars"].value\
+            or CONFIG["include-all-local-vars"].value:
+        try:
+            calling_frame_locals = dict(inspect.getargvalues(frame)
+                                        .locals.items())
+        except Exception as e:
+            pytest.log.step("Failed to retrieve local variables for {}".
+                            format(module_line_parent), log_level=5)
+            _debug_print("{}", DEBUG["verify"], e)
+    return calling_frame_locals
+
+
+def _stack_signature(frame, exc_type, stop_at_test, full_method_trace):
+    # Return a key identifying the traceback of a verify call from frame:
+    # the (code object, line number) of each frame in the traceback and
+    # the options used to format it.
+    signature = [exc_type, stop_at_test, full_method_trace]
+    while frame is not None and len(signature) < MAX_TRACEBACK_DEPTH:
+        signature.append((frame.f_code, frame.f_lineno))
+        frame = frame.f_back
+    return tuple(signature)
+
+
 def _trace_end_detected(func_call_line):
     # Check for the stop keywords in the function call source line
     # (traceback). Returns True if keyword found and traceback is
@@ -1012,8 +2972,9 @@ def _trace_end_detected(func_call_line):
     return any(item in func_call_line for item in stop_keywords)
 
 
-def _save_result(msg, status, exc_type, exc_tb, stop_at_test,
-                 full_method_trace, raise_immediately):
+def _save_result(msg, status, exc_type, stop_at_test, full_method_trace,
+                 raise_immediately, buffer=None, duration=None, depth=3,
+                 raised=False):
     # TODO update this
     """Save a result of verify/_verify.
     Items to save:
@@ -1026,27 +2987,67 @@ def _save_result(msg, status, exc_type, exc_tb, stop_at_test,
                 complete,
                 raised,
                 res_index
+    Passing results only record the code location of the call to verify,
+    the source is extracted if and when it is required (see
+    Result.source). depth is the stack depth of the function that called
+    verify (the source of the result). A failure raised by the session
+    thread as it is saved is saved as raised (the record written by a
+    child process must not be raised again by the session).
+    Returns the traceback of a failure or warning.
     """
-    stack = inspect.stack()
-    depth = 3
+    # Frame of the function that called verify
+    frame = sys._getframe(depth)
 
     _debug_print("Saving a result of verify function", DEBUG["verify"])
     fixture_name = None
     fixture_scope = None
-    if SessionStatus.phase != "call":
-        for d in range(depth, depth+6):  # TODO use max tb depth?
-            stack_locals = OrderedDict(inspect.getargvalues(stack[d][0]).
-                                       locals.items())
-            for item in stack_locals.values():
-                print item
-                if isinstance(item, FixtureDef):
-                    fixture_name = item.argname
-                    fixture_scope = item.scope
-                    _debug_print("scope for {} is {} [{}]".format(fixture_name,
-                                 fixture_scope, d), DEBUG["verify"])
-            if fixture_name:
-                break
+    context = None
+    if buffer is not None:
+        # Saved by another thread
+        context = _thread_context()
+        fixture_name = context.fixture_name
+        fixture_scope = context.fixture_scope
+        store = buffer
+    else:
+        store = Verifications.store
+        if SessionStatus.phase != "call" and SessionStatus.fixture_stack:
+            fixture_name, fixture_scope = _fixture_info(
+                SessionStatus.fixture_stack[-1])
+    _debug_print("scope for {} is {}", DEBUG["verify"], fixture_name,
+                 fixture_scope)
 
+    type_code = status[0]
+    if type_code == "P":
+        # Fast path - no source or locals extraction for passing results
+        store.add_result(Result(msg, status, type_code, fixture_scope,
+                                fixture_name, None, None, raise_immediately,
+                                source_location=(frame.f_code.co_filename,
+                                                 frame.f_lineno,
+                                                 frame.f_code.co_name),
+                                context=context, duration=duration))
+        return None
+
+    # Types processed by this function are "P", "F" and "W"
+    signature = _stack_signature(frame, exc_type, stop_at_test,
+                                 full_method_trace)
+    failure_traceback = store.find_traceback(signature)
+    if failure_traceback is not None:
+        # Repeat of a saved (not yet raised) traceback, e.g. a failure
+        # in a loop. Only the local variables of the call are saved.
+        failure_traceback.occurrences += 1
+        first_result = failure_traceback.result_link
+        source_locals = _frame_locals(frame, first_result.source_function)
+        if CONFIG["release-traceback-frames"].value:
+            source_locals = _locals_repr(source_locals)
+        store.add_result(Result(msg, status, type_code, fixture_scope,
+                                fixture_name, first_result.source_function,
+                                first_result.source_code, raise_immediately,
+                                source_locals=source_locals,
+                                fail_traceback_link=failure_traceback,
+                                context=context, duration=duration))
+        return failure_traceback
+
+    stack = _stack(sys._getframe(), MAX_TRACEBACK_DEPTH)
     source_function, source_locals, source_call = \
         _get_calling_func(stack, depth, True, full_method_trace)
     tb_depth_1 = [source_function]
@@ -1055,32 +3056,57 @@ def _save_result(msg, status, exc_type, exc_tb, stop_at_test,
     tb_depth_1.extend(source_call)
 
     depth += 1
-    s_res = Verifications.saved_results
-    type_code = status[0]
-    if type_code == "F" or type_code == "W":
-        # Types processed by this function are "P", "F" and "W"
-        trace_complete = _get_complete_traceback(stack, depth, stop_at_test,
-                                                 full_method_trace,
-                                                 tb=tb_depth_1)
-
-        s_tb = Verifications.saved_tracebacks
-        s_tb.append(FailureTraceback(exc_type, exc_tb, trace_complete))
-        failure_traceback = s_tb[-1]
-    else:
-        failure_traceback = None
-    s_res.append(Result(msg, status, type_code, fixture_scope,
-                        fixture_name, source_function, source_call,
-                        raise_immediately, source_locals=source_locals,
-                        fail_traceback_link=failure_traceback))
-    if type_code == "F" or type_code == "W":
-        s_tb[-1].result_link = s_res[-1]
+    trace_complete = _get_complete_traceback(stack, depth, stop_at_test,
+                                             full_method_trace,
+                                             tb=tb_depth_1)
+    del stack
+    if CONFIG["release-traceback-frames"].value:
+        trace_complete = _render_traceback_locals(trace_complete)
+        source_locals = _locals_repr(source_locals)
+
+    # The exception is created if and when the result is raised
+    failure_traceback = FailureTraceback(exc_type, None, trace_complete,
+                                         raised)
+    store.add_traceback(failure_traceback, signature)
+    result = Result(msg, status, type_code, fixture_scope, fixture_name,
+                    source_function, source_call, raise_immediately,
+                    source_locals=source_locals,
+                    fail_traceback_link=failure_traceback, context=context,
+                    duration=duration)
+    failure_traceback.result_link = result
+    store.add_result(result)
+    return failure_traceback
 
 
 def _set_saved_raised():
     # Set saved traceback as raised so they are not subsequently raised
     # again.
-    for saved_traceback in Verifications.saved_tracebacks:
-        saved_traceback.raised = True
+    Verifications.store.set_raised(CONFIG["release-traceback-frames"].value)
+
+
+def _locals_repr(frame_locals):
+    # Render a dictionary of local variables as text, limiting the
+    # length of each value and of the complete text.
+    if not frame_locals:
+        return frame_locals
+    items = []
+    for name, value in frame_locals.iteritems():
+        try:
+            value_repr = _LOCALS_REPR.repr(value)
+        except Exception as e:
+            value_repr = "<repr failed: {}>".format(type(e).__name__)
+        items.append("{!r}: {}".format(name, value_repr))
+    locals_repr = "{{{}}}".format(", ".join(items))
+    if len(locals_repr) > MAX_LOCALS_REPR_LENGTH:
+        locals_repr = locals_repr[:MAX_LOCALS_REPR_LENGTH - 3] + "..."
+    return locals_repr
+
+
+def _render_traceback_locals(trace):
+    # Replace the local variable dictionaries in a formatted traceback
+    # with their (size limited) text.
+    return [_locals_repr(line) if isinstance(line, dict) else line
+            for line in trace]
 
 
 def _get_call_source(func_source, func_call_source_line, call_line_number,
@@ -1099,7 +3125,8 @@ def _get_call_source(func_source, func_call_source_line, call_line_number,
                                      func_call_source_line)
     preceding_line_index = call_line_number - func_line_number - 1
 
-    while left != right and preceding_line_index > call_line_number - func_line_number - 10:
+    while left != right and preceding_line_index >= 0 and \
+            preceding_line_index > call_line_number - func_line_number - 10:
         source_line = re.sub('[\r\n]', '', func_source[0][preceding_line_index])
         trace_level.insert(0, source_line)
         left, right = _parentheses_count(left, right,
@@ -1111,70 +3138,116 @@ def _get_call_source(func_source, func_call_source_line, call_line_number,
     return trace_level
 
 
-def print_saved_results(column_key_order="Step", extra_info=False):
+def print_saved_results(column_key_order="Step", extra_info=False,
+                        rows=None, max_rows=None, max_cell_width=None):
     """Format the saved results as a table and print.
-    The results are printed in the order they were saved.
+    The results are printed in the order they were saved. The table is
+    written as the results are read (only the rows used to size the
+    columns are held in memory) and logged in blocks of lines.
     Keyword arguments:
     column_key_order -- specify the column order. Default is to simply
     print the "Step" (top level message) first.
     extra_info -- print an extra column containing the "Extra Info" field
     values.
+    rows -- "all" results or only "failures" (failures and warnings).
+    Default: results-table-rows option.
+    max_rows -- maximum number of rows to print, 0 for no limit. Default:
+    results-table-max-rows option.
+    max_cell_width -- maximum width of a column, longer values are
+    truncated. Default: results-table-cell-width option.
+    The results that aren't printed are totalled by type.
     """
     if not isinstance(column_key_order, (tuple, list)):
         column_key_order = [column_key_order]
-    _debug_print("Column order: {}".format(column_key_order),
-                 DEBUG["print-saved"])
-
-    to_print = []
-    for saved_result in Verifications.saved_results:
-        to_print.append(saved_result.formatted_dict())
-
-    key_val_lengths = {}
-    if len(to_print) > 0:
-        _get_val_lengths(to_print, key_val_lengths)
-        headings = _get_key_lengths(key_val_lengths)
-        pytest.log.high_level_step("Saved results")
-        _print_headings(to_print[0], headings, key_val_lengths,
-                        column_key_order)
-        for result in to_print:
-            _print_result(result, key_val_lengths, column_key_order)
-        print "Extra fields: raise_immediately.printed.raised"
-
-
-def _print_result(result, key_val_lengths, column_key_order):
-    # Print a table row for a single saved result.
-    line = ""
-    for key in column_key_order:
-        # Print values in the order defined by column_key_order.
-        length = key_val_lengths[key]
-        line += '| {0:^{1}} '.format(str(result[key]), length)
-    for key in result.keys():
-        key = key.strip()
-        if key not in column_key_order:
-            length = key_val_lengths[key]
-            if key == "Extra Info":
-                val = result[key].format_result_info()
-            else:
-                val = result[key]
-            line += '| {0:^{width}} '.format(str(val), width=length)
-    line += "|"
-    pytest.log.detail_step(line)
-
-
-def _get_val_lengths(saved_results, key_val_lengths):
-    # Update the maximum field length dictionary based on the length of
-    # the values.
-    for result in saved_results:
-        for key, value in result.items():
-            key = key.strip()
-            if key not in key_val_lengths:
-                key_val_lengths[key] = 0
-            if key == "Extra Info":
-                length = max(key_val_lengths[key],
-                             len(str(value.format_result_info())))
-            else:
-                length = max(key_val_lengths[key], len(str(value)))
-            key_val_lengths[key] = length
+    _debug_print("Column order: {}", DEBUG["print-saved"], column_key_order)
+    if rows is None:
+        rows = CONFIG["results-table-rows"].value
+    if max_rows is None:
+        max_rows = CONFIG["results-table-max-rows"].value
+    if max_cell_width is None:
+        max_cell_width = CONFIG["results-table-cell-width"].value
+
+    results = Verifications.store.results
+    if not len(results):
+        return
+    columns = list(column_key_order) + [
+        key for key in Result.table_columns() if key not in column_key_order]
+    column_indexes = [Result.table_columns().index(key) for key in columns]
+    # type_code: count of the results not printed
+    not_printed = OrderedDict()
+    table_rows = _table_rows(results, column_indexes, rows == "failures",
+                             max_rows, not_printed)
+
+    # Size the columns from the first rows (and the headings)
+    sample = list(itertools.islice(table_rows, TABLE_WIDTH_SAMPLE_ROWS))
+    key_val_lengths = OrderedDict((key, 0) for key in columns)
+    for values in sample:
+        for key, value in zip(columns, values):
+            key_val_lengths[key] = max(key_val_lengths[key], len(value))
+    if max_cell_width:
+        for key in columns:
+            key_val_lengths[key] = min(key_val_lengths[key], max_cell_width)
+    headings = _get_key_lengths(key_val_lengths)
+    widths = [key_val_lengths[key] for key in columns]
+
+    pytest.log.high_level_step("Saved results")
+    writer = _TableWriter()
+    _write_headings(writer, columns, headings, key_val_lengths)
+    for values in itertools.chain(sample, table_rows):
+        writer.write("".join(
+            "| {0:^{1}} ".format(_truncate(value, width), width)
+            for value, width in zip(values, widths)) + "|")
+    if not_printed:
+        writer.write("{} results not printed: {}".format(
+            sum(not_printed.itervalues()),
+            ", ".join("{} {}".format(count, RESULT_TYPES.get(type_code,
+                                                             type_code))
+                      for type_code, count in not_printed.iteritems())))
+    writer.write("Extra fields: raise_immediately.printed.raised")
+    writer.flush()
+
+
+def _table_rows(results, column_indexes, failures_only, max_rows,
+                not_printed):
+    # Generate the (text) values of the columns of each result to print.
+    # The type codes of the results that aren't printed are counted in
+    # not_printed.
+    printed = 0
+    for result in results:
+        if (failures_only and result.type_code == "P") or \
+                (max_rows and printed >= max_rows):
+            not_printed[result.type_code] = \
+                not_printed.get(result.type_code, 0) + 1
+            continue
+        printed += 1
+        values = result.table_values()
+        yield [str(values[i]) for i in column_indexes]
+
+
+def _truncate(value, width):
+    # Truncate a table cell value longer than width.
+    if len(value) > width:
+        return value[:max(width - 3, 0)] + "..."[:width]
+    return value
+
+
+class _TableWriter(object):
+    """Buffer of table lines logged (at the detail step level) in blocks
+    rather than a log call for each line.
+    """
+    def __init__(self, flush_lines=TABLE_FLUSH_LINES):
+        self.flush_lines = flush_lines
+        self._lines = []
+
+    def write(self, line):
+        self._lines.append(line)
+        if len(self._lines) >= self.flush_lines:
+            self.flush()
+
+    def flush(self):
+        if self._lines:
+            pytest.log.detail_step("\n".join(self._lines))
+            self._lines = []
 
 
 def _get_key_lengths(key_val_lengths):
@@ -1186,7 +3259,7 @@ def _get_key_lengths(key_val_lengths):
     headings = {}
     for key, val in key_val_lengths.iteritems():
         _debug_print("key: {}, key length: {}, length of field from values "
-                     "{}".format(key, len(key), val), DEBUG["print-saved"])
+                     "{}", DEBUG["print-saved"], key, len(key), val)
         if len(key) > val:
             # The key is longer then the value length
             if ' ' in key or '/' in key:
@@ -1194,14 +3267,14 @@ def _get_key_lengths(key_val_lengths):
                 space_indices = [m.start() for m in re.finditer(' ', key)]
                 slash_indices = [m.start() for m in re.finditer('/', key)]
                 space_indices.extend(slash_indices)
-                _debug_print("key can be split @ {}".format(space_indices),
-                             DEBUG["print-saved"])
+                _debug_print("key can be split @ {}", DEBUG["print-saved"],
+                             space_indices)
                 key_centre_index = int(len(key)/2)
                 split_index = min(space_indices, key=lambda x: abs(
                     x - key_centre_index))
-                _debug_print('The closest index to the middle ({}) is {}'
-                             .format(key_centre_index, split_index),
-                             DEBUG["print-saved"])
+                _debug_print('The closest index to the middle ({}) is {}',
+                             DEBUG["print-saved"], key_centre_index,
+                             split_index)
                 # Add the split key string as two strings (line 1, line
                 # 2) to the headings dictionary.
                 headings[key] = [key[:split_index+1].strip(),
@@ -1233,36 +3306,35 @@ def _get_line_length(key_val_lengths):
     return line_length
 
 
-def _print_headings(first_result, headings, key_val_lengths,
-                    column_key_order):
-    # Print the headings of the saved results table (keys of
-    # dictionaries stored in saved_results).
+def _write_headings(writer, columns, headings, key_val_lengths):
+    # Write the headings of the saved results table.
     lines = ["", "", ""]
-    line_length = _get_line_length(key_val_lengths)
-    pytest.log.detail_step("_" * line_length)
-    for key in column_key_order:
+    writer.write("_" * _get_line_length(key_val_lengths))
+    for key in columns:
         field_length = key_val_lengths[key]
         for line_index in (0, 1):
             lines[line_index] += '| ' + '{0:^{width}}'.format(
                 headings[key][line_index], width=field_length) + ' '
         lines[2] += '|-' + '-'*field_length + '-'
-    for key, value in first_result.items():
-        key = key.strip()
-        if not (((type(column_key_order) is list) and
-                 (key in column_key_order)) or
-                ((type(column_key_order) is not list) and
-                 (key == column_key_order))):
-            field_length = key_val_lengths[key]
-            for line_index in (0, 1):
-                lines[line_index] += ('| ' + '{0:^{width}}'.format(
-                    headings[key][line_index], width=field_length) + ' ')
-            lines[2] += ('|-' + '-'*field_length + '-')
     for line in lines:
-        line += "|"
-        pytest.log.detail_step(line)
+        writer.write(line + "|")
+
+
+def _intern(value):
+    # Intern (byte) strings that are repeated in many results, e.g.
+    # module, class, phase, scope and fixture names.
+    if type(value) is str:
+        return intern(value)
+    return value
 
 
-def _debug_print(msg, flag):
-    # Print a debug message if the corresponding flag is set.
+def _debug_print(msg, flag, *args):
+    # Print a debug message if the corresponding flag is set. The message
+    # is only built if it is printed: msg may be a format string for args
+    # or a callable that returns the message.
     if flag.enabled:
+        if callable(msg):
+            msg = msg()
+        elif args:
+            msg = msg.format(*args)
         print "DEBUG({}): {}".format(flag.name, msg)
@@ -9,7 +9,8 @@ setup(
     packages=find_packages(),
     include_package_data=True,
     install_requires=["pytest>=2.8.0", "pytest-loglevels>=0.3.0", "future",
-                      "decorator"],
+                      'monotonic; python_version < "3.3"'],
+    extras_require={"numpy": ["numpy"]},
     # the following makes a plugin available to pytest
     entry_points={'pytest11': ['verify = pytest_verify.pytest_verify']},
     # custom PyPI classifier for pytest plugins
@@ -0,0 +1,65 @@
+import os
+from multiprocessing import Process
+from pytest_verify.pytest_verify import (
+    ChildResults,
+    ChildResultStore,
+    ResultStore,
+    SessionStatus,
+    Verifications,
+    VerificationException,
+    _merge_child_results,
+    _start_child_results,
+    _stop_child_results,
+    _thread_buffer
+)
+from test_result_store import _failure, _result
+
+
+def _save_child_results():
+    # Run by the forked child process
+    store = Verifications.store
+    if not isinstance(store, ChildResultStore) or \
+            _thread_buffer() is not None:
+        os._exit(2)
+    store.add_result(_result("child passes", "test_one"))
+    raised = _failure("child raises", "test_one")
+    raised.traceback_link.raised = True
+    store.add_traceback(raised.traceback_link)
+    store.add_result(raised)
+    saved = _failure("child saves", "test_one")
+    store.add_traceback(saved.traceback_link)
+    store.add_result(saved)
+
+
+def test_forked_child_results_merged(monkeypatch):
+    store = ResultStore()
+    monkeypatch.setattr(Verifications, "store", store)
+    monkeypatch.setattr(ChildResults, "directory", None)
+    monkeypatch.setattr(ChildResults, "offsets", {})
+    # Forked by a thread other than the session thread
+    monkeypatch.setattr(SessionStatus, "thread_id", -1)
+    monkeypatch.setattr(SessionStatus, "module", "test_module")
+    monkeypatch.setattr(SessionStatus, "class_name", None)
+    monkeypatch.setattr(SessionStatus, "test_function", "test_one")
+    monkeypatch.setattr(SessionStatus, "phase", "call")
+    _start_child_results()
+    directory = ChildResults.directory
+    assert "PYTEST_VERIFY_CHILD_RESULTS" not in os.environ
+    try:
+        child = Process(target=_save_child_results)
+        child.start()
+        child.join()
+        assert child.exitcode == 0
+        _merge_child_results()
+        assert [result.msg for result in store.results] == \
+            ["child passes", "child raises", "child saves"]
+        # Only the failure the child didn't raise is raised by the session
+        assert store.first_unraised(VerificationException) is \
+            store.results[2].traceback_link
+        assert store.results[1].traceback_link.raised
+    finally:
+        _stop_child_results()
+        # Restore the session's store before the plugin raises its unsaved
+        # failures ("child saves") at the end of the test
+        monkeypatch.undo()
+    assert not os.path.exists(directory)
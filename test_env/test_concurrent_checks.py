@@ -0,0 +1,55 @@
+import threading
+import time
+from pytest_verify.pytest_verify import (
+    BatchCheck,
+    SessionStatus,
+    ThreadResults,
+    VerifyContext,
+    _run_concurrently,
+    _verify
+)
+
+
+def test_checks_abandoned_at_timeout():
+    started = []
+
+    def slow_check():
+        started.append(1)
+        time.sleep(0.5)
+        return True
+    batch = [BatchCheck("fast", lambda: True)] + \
+        [BatchCheck(i, slow_check) for i in range(3)]
+    _run_concurrently(batch, 2, 0.1, VerifyContext())
+    assert batch[0].outcome[:2] == (True, None)
+    assert batch[0].outcome[2] < 0.1
+    assert [check.outcome for check in batch[1:]] == [None, None, None]
+    time.sleep(0.6)
+    # Only the checks started before the timeout were run
+    assert len(started) == 2
+
+
+def test_results_of_expired_context_dropped(monkeypatch):
+    monkeypatch.setattr(SessionStatus, "thread_id",
+                        threading.current_thread().ident)
+    context = VerifyContext()
+    entries = []
+
+    def check():
+        with context:
+            _verify(True, "check passes", False, False, None, None, False,
+                    True, None)
+            entries.extend(ThreadResults.local.buffer.take())
+
+    context.expired = True
+    thread = threading.Thread(target=check)
+    thread.start()
+    thread.join()
+    assert entries == []
+    context.expired = False
+    thread = threading.Thread(target=check)
+    thread.start()
+    thread.join()
+    assert [entry[2].msg for entry in entries if entry[2] is not None and
+            hasattr(entry[2], "msg")] == ["check passes"]
+    with ThreadResults.lock:
+        del ThreadResults.buffers[:]
@@ -0,0 +1,53 @@
+from array import array
+from pytest_verify.pytest_verify import (
+    LazyMessage,
+    _check_array,
+    _check_each,
+    _lazy_message
+)
+
+
+def test_array_failures_describe_samples_and_range():
+    samples = array("d", [0.5] * 100)
+    samples[3] = 12.5
+    samples[7] = 10.5
+    failures, warnings, total = _check_array(samples, lambda x: x < 10,
+                                             None, 10)
+    assert warnings is None
+    assert failures.describe("samples", total) == (
+        "samples (2/100 failed, e.g. [3: 12.5, 7: 10.5], failing values "
+        "min 10.5 max 12.5)")
+
+
+def test_array_typecodes():
+    for typecode, values in (("b", [-1, 2]), ("H", [1, 2]), ("l", [1, 2]),
+                             ("f", [0.5, 2.0]), ("u", u"ab")):
+        failures, _, total = _check_array(
+            array(typecode, values), lambda x: x == values[0], None, 10)
+        assert total == 2
+        assert failures.count == 1
+        assert failures.samples[0][0] == 1
+
+
+def test_each_failures_stop_at_limit():
+    failures, warnings, total = _check_each(
+        iter(range(100)), lambda x: x % 10, lambda x: x < 95, 3, 2)
+    assert total == 21
+    assert failures.describe("not multiples of 10", total) == (
+        "not multiples of 10 (3/21 failed, stopped at failure limit, "
+        "e.g. [0: 0, 10: 10, ...])")
+    assert warnings.count == 0
+
+
+def test_passing_summary_message_is_lazy():
+    calls = []
+
+    def message():
+        calls.append(1)
+        return "values"
+    failures, _, total = _check_each([1, 2], lambda x: x, None, None, 5)
+    summary = failures.describe(_lazy_message(message, None), total)
+    assert isinstance(summary, LazyMessage)
+    assert not calls
+    assert str(summary) == "values (2/2 passed)"
+    assert calls == [1]
@@ -0,0 +1,145 @@
+import json
+from collections import OrderedDict
+from pytest_verify.pytest_verify import ResultStore, _table_rows, _truncate
+from test_result_store import _result
+
+pytest_plugins = "pytester"
+
+# Sessions are run in a subprocess, the plugin state is module level
+
+
+def test_results_file(testdir):
+    testdir.makepyfile("""
+        from pytest import verify
+
+        def test_results():
+            verify(True, "check passes")
+            verify(False, "check fails", raise_immediately=False)
+    """)
+    path = testdir.tmpdir.join("results.jsonl")
+    result = testdir.runpytest_subprocess("--results-file", str(path))
+    result.assert_outcomes(failed=1)
+    result.stdout.fnmatch_lines(["*check fails*"])
+    records = [json.loads(line) for line in path.readlines()]
+    assert [(record["msg"], record["type_code"]) for record in records] == \
+        [("check passes", "P"), ("check fails", "F")]
+    assert records[1]["traceback"] == 0
+
+
+def test_xdist_worker_results(testdir):
+    testdir.makepyfile("""
+        from pytest import verify
+
+        def test_one():
+            verify(True, "test_one passes")
+
+        def test_two():
+            verify(False, "test_two fails", raise_immediately=False)
+    """)
+    path = testdir.tmpdir.join("results.jsonl")
+    result = testdir.runpytest_subprocess("-n", "2", "--results-file",
+                                          str(path))
+    result.assert_outcomes(passed=1, failed=1)
+    records = dict((record["msg"], record) for record in
+                   (json.loads(line) for line in path.readlines()))
+    assert sorted(records) == ["test_one passes", "test_two fails"]
+    assert records["test_one passes"]["worker"] in ("gw0", "gw1")
+    assert records["test_two fails"]["type_code"] == "F"
+    assert records["test_two fails"]["test_function"] == "test_two"
+
+
+def test_results_table_rows():
+    store = ResultStore()
+    for message in ("pass 1", "pass 2", "pass 3"):
+        store.add_result(_result(message, "test_one"))
+    store.add_result(_result("fail 1", "test_one", status="FAIL",
+                             type_code="F"))
+    store.add_result(_result("fail 2", "test_one", status="FAIL",
+                             type_code="F"))
+    message_index = 1
+    not_printed = OrderedDict()
+    rows = _table_rows(store.results, [message_index], True, 1, not_printed)
+    assert list(rows) == [["fail 1"]]
+    assert not_printed == {"P": 3, "F": 1}
+    assert _truncate("a long message", 9) == "a long..."
+    assert _truncate("short", 9) == "short"
+
+
+def test_results_table_options(testdir):
+    testdir.makepyfile("""
+        from pytest import verify
+
+        def test_results():
+            for i in range(3):
+                verify(True, "check {} passes".format(i))
+            verify(False, "first check fails", raise_immediately=False)
+            verify(False, "second check fails", raise_immediately=False)
+    """)
+    result = testdir.runpytest_subprocess(
+        "--results-table-rows", "failures", "--results-table-max-rows", "1",
+        "--results-table-cell-width", "12")
+    result.assert_outcomes(failed=1)
+    output = result.stdout.str()
+    table = output[output.index("Saved results"):]
+    assert "first che..." in table
+    assert "second ch..." not in table
+    assert "check 0 p..." not in table
+    assert "4 results not printed: 3 passed, 1 failed" in table
+
+
+def test_quiet_passes_logged_before_next_step(testdir):
+    testdir.makepyfile("""
+        from pytest import log, verify
+
+        def test_steps():
+            log.high_level_step("First step")
+            for i in range(3):
+                verify(True, "first step check {}".format(i))
+            log.high_level_step("Second step")
+            verify(True, "second step check")
+            verify(False, "second step fails", raise_immediately=False)
+    """)
+    result = testdir.runpytest_subprocess("-s", "--quiet-passes", "true")
+    result.assert_outcomes(failed=1)
+    output = result.stdout.str()
+    # Logged during the test (before the results table)
+    output = output[:output.index("Saved results")]
+    assert "first step check" not in output
+    assert output.index("First step") < output.index("3 checks passed") < \
+        output.index("Second step") < output.index("1 checks passed") < \
+        output.index("second step fails")
+
+
+def test_slowest_timings(testdir):
+    testdir.makepyfile("""
+        import time
+        import pytest
+        from pytest import log, verify
+
+        @pytest.fixture
+        def slow_resource():
+            time.sleep(0.2)
+
+        @pytest.fixture
+        def slow_fixture(slow_resource):
+            time.sleep(0.1)
+
+        def test_steps(slow_fixture):
+            log.high_level_step("Slow step")
+            time.sleep(0.3)
+            verify(True, "slow step check")
+            log.high_level_step("Fast step")
+            verify(True, "fast step check")
+    """)
+    result = testdir.runpytest_subprocess("-s", "--slowest-timings", "2")
+    result.assert_outcomes(passed=1)
+    output = result.stdout.str()
+    output = output[output.index("Slowest fixtures"):]
+    # The setup time of a fixture excludes the fixtures it requests
+    result.stdout.re_match_lines([
+        r".*0\.2\d\ds setup function slow_resource \(1 times",
+        r".*0\.1\d\ds setup function slow_fixture \(1 times"])
+    steps = output[output.index("Slowest steps"):]
+    assert steps.index("call test_steps: Slow step") < \
+        steps.index("call test_steps: Fast step")
+    result.stdout.re_match_lines([r".*0\.3\d\ds call test_steps: Slow step"])
@@ -0,0 +1,180 @@
+import json
+from pytest_verify.pytest_verify import (
+    ColumnarResultStore,
+    FailureTraceback,
+    JsonLinesResultSink,
+    SessionStatus,
+    Result,
+    ResultStore,
+    StreamingResultStore,
+    VerificationException,
+    Verifications,
+    VerifyContext,
+    WorkerResultStore,
+    pytest_runtest_logreport
+)
+
+
+def _result(message, test_function, phase="call", scope=None,
+            fixture_name=None, class_name=None, status="PASS",
+            type_code="P"):
+    context = VerifyContext()
+    context.module = "test_module"
+    context.class_name = class_name
+    context.test_function = test_function
+    context.phase = phase
+    context.step = "step"
+    return Result(message, status, type_code, scope, fixture_name,
+                  "test_module.py:1:" + test_function, None, False,
+                  context=context)
+
+
+def _messages(results):
+    return [result.msg for result in results]
+
+
+def test_fixture_results_in_save_order():
+    store = ResultStore()
+    # A module fixture's setup results keyed by the test that requested it
+    store.add_result(_result("first", "test_one", "setup", "module", "fix"))
+    store.add_result(_result("second", "test_two", "setup", "module", "fix",
+                             class_name="TestClass"))
+    store.add_result(_result("third", "test_one", "setup", "module", "fix",
+                             status="FAIL", type_code="F"))
+    fixture_results = store.fixture_results("module", "test_module",
+                                            "setup")
+    assert list(fixture_results) == ["fix"]
+    results = fixture_results["fix"]
+    assert _messages(results[:-1]) == ["first", "second", "third"]
+    assert results[-1] == {"P": 2, "F": 1}
+
+
+def test_call_results_in_save_order():
+    store = ResultStore()
+    store.add_result(_result("first", "test_one"))
+    store.add_result(_result("other test", "test_two"))
+    store.add_result(_result("second", "test_one", class_name="TestClass"))
+    store.add_result(_result("third", "test_one"))
+    results, summary = store.call_results("test_one")
+    assert _messages(results) == ["first", "second", "third"]
+    assert summary == {"P": 3}
+
+
+def test_columnar_store_rebuilds_results():
+    store = ColumnarResultStore()
+    passed = _result("passed", "test_one")
+    passed._source_location = ("test_module.py", 10, "test_one")
+    passed.duration = 0.5
+    store.add_result(passed)
+    failed = _result("failed", "test_one", status="FAIL", type_code="F")
+    failed.traceback_link = FailureTraceback(VerificationException, None,
+                                             [])
+    failed.traceback_link.result_link = failed
+    store.add_result(failed)
+    results, summary = store.call_results("test_one")
+    assert summary == {"P": 1, "F": 1}
+    rebuilt = results[0]
+    assert rebuilt is not passed
+    for field in ("step", "msg", "status", "type_code", "module",
+                  "test_function", "phase", "raise_immediately",
+                  "timestamp", "duration"):
+        assert getattr(rebuilt, field) == getattr(passed, field)
+    assert rebuilt.source["module-function-line"] == \
+        "test_module.py:10:test_one"
+    # Results with a traceback are kept as they were saved
+    assert results[1] is failed
+    assert results[1].traceback_link.result_link is results[1]
+
+
+def test_columnar_store_keeps_printed_and_identity():
+    store = ColumnarResultStore()
+    store.add_result(_result("passed", "test_one"))
+    result = store.results[0]
+    assert store.results[0] is result
+    assert not result.printed
+    result.printed = True
+    del result
+    # Rebuilt again with the printed flag set
+    assert store.results[0].printed
+    assert store.results[-1].printed
+
+
+def _failure(message, test_function):
+    result = _result(message, test_function, status="FAIL", type_code="F")
+    result.traceback_link = FailureTraceback(VerificationException, None,
+                                             [])
+    result.traceback_link.result_link = result
+    return result
+
+
+def test_streaming_store_writes_and_indexes_results(tmpdir):
+    path = str(tmpdir.join("results.jsonl"))
+    store = StreamingResultStore(JsonLinesResultSink(path))
+    store.add_result(_result("first", "test_one"))
+    failed = _failure("failed", "test_one")
+    store.add_traceback(failed.traceback_link)
+    store.add_result(failed)
+    store.add_result(_result("other test", "test_two"))
+    # Read back from the file during the session
+    assert len(store.results) == 3
+    results, summary = store.call_results("test_one")
+    assert _messages(results) == ["first", "failed"]
+    assert results[1] is failed
+    assert summary == {"P": 1, "F": 1}
+    assert store.results[2].test_function == "test_two"
+    with open(path) as results_file:
+        records = [json.loads(line) for line in results_file]
+    assert [record["msg"] for record in records] == \
+        ["first", "failed", "other test"]
+    assert records[1]["traceback"] == 0
+
+
+def test_streaming_store_summary_closes_file(tmpdir):
+    path = str(tmpdir.join("results.jsonl"))
+    store = StreamingResultStore(JsonLinesResultSink(path))
+    store.add_result(_result("first", "test_one"))
+    summary_store = store.summary_store()
+    assert store.sink._file.closed
+    results, summary = summary_store.call_results("test_one")
+    assert _messages(results) == ["first"]
+    results[0].printed = True
+    assert summary_store.results[0].printed
+
+
+class _WorkerReport(object):
+    # Report of the setup phase received from an xdist worker
+    def __init__(self, records):
+        self.verify_test = ("test_module", None, "test_one", ["fix"])
+        self.verify_records = records
+        self.verify_worker = "gw1"
+
+
+def test_worker_results_merged_by_controller(monkeypatch):
+    worker_store = WorkerResultStore()
+    worker_store.add_result(_result("passed", "test_one"))
+    failed = _failure("failed", "test_one")
+    worker_store.add_traceback(failed.traceback_link)
+    worker_store.add_result(failed)
+    records = worker_store.take_records()
+    assert worker_store.take_records() == []
+    # Records are sent to the controller with the test report
+    records = json.loads(json.dumps(records))
+
+    controller_store = ResultStore()
+    monkeypatch.setattr(Verifications, "store", controller_store)
+    monkeypatch.setattr(SessionStatus, "run_order", [])
+    monkeypatch.setattr(SessionStatus, "test_fixtures", {})
+    monkeypatch.setattr(SessionStatus, "test_workers", {})
+    pytest_runtest_logreport(_WorkerReport(records))
+    assert SessionStatus.run_order == [("test_module", None, "test_one")]
+    assert SessionStatus.test_workers == {"test_one": "gw1"}
+    results = controller_store.results
+    assert _messages(results) == ["passed", "failed"]
+    assert [result.worker for result in results] == ["gw1", "gw1"]
+    merged_traceback = results[1].traceback_link
+    assert controller_store.tracebacks == [merged_traceback]
+    assert merged_traceback.exc_type is VerificationException
+    assert merged_traceback.result_link is results[1]
+    # Raised by the worker, not again by the controller
+    assert merged_traceback.raised
+    assert controller_store.first_unraised(VerificationException) is None
@@ -0,0 +1,58 @@
+import threading
+from pytest_verify.pytest_verify import (
+    FailureTraceback,
+    ResultStore,
+    SessionStatus,
+    ThreadResults,
+    Verifications,
+    VerificationException,
+    VerifyContext,
+    _set_raised_by_thread,
+    _thread_buffer,
+    _thread_context
+)
+
+
+def _in_thread(function):
+    # Return the value returned by function called in a new thread.
+    values = []
+    thread = threading.Thread(target=lambda: values.append(function()))
+    thread.start()
+    thread.join()
+    return values[0]
+
+
+def test_thread_exception_raised_by_test(monkeypatch):
+    store = ResultStore()
+    monkeypatch.setattr(Verifications, "store", store)
+    exception = VerificationException("raised in a thread")
+    failure_traceback = FailureTraceback(VerificationException, None, [])
+    failure_traceback.exception = exception
+    store.add_traceback(failure_traceback)
+    # A different exception of the same type is raised by the test
+    _set_raised_by_thread((VerificationException,
+                           VerificationException("other"), None))
+    assert store.first_unraised(VerificationException) is failure_traceback
+    # The thread's exception is passed on to the test (e.g. by a pool)
+    _set_raised_by_thread((VerificationException, exception, None))
+    assert failure_traceback.raised
+    assert store.first_unraised(VerificationException) is None
+
+
+def test_thread_uses_published_context(monkeypatch):
+    monkeypatch.setattr(SessionStatus, "thread_id",
+                        threading.current_thread().ident)
+    published = VerifyContext()
+    published.test_function = "test_one"
+    monkeypatch.setattr(SessionStatus, "context", published)
+    assert _thread_buffer() is None
+    assert _in_thread(_thread_context) is published
+    bound = VerifyContext()
+
+    def bound_context():
+        with bound:
+            return _thread_context()
+    assert _in_thread(bound_context) is bound
+    assert _in_thread(_thread_buffer) is not None
+    with ThreadResults.lock:
+        del ThreadResults.buffers[:]
@@ -0,0 +1,69 @@
+from collections import OrderedDict
+from pytest_verify.pytest_verify import (
+    SessionStatus,
+    Timings,
+    _add_fixture_time,
+    _end_step,
+    _result_from_record,
+    _result_record,
+    _start_step
+)
+from test_result_store import _result
+
+
+class _FixtureDef(object):
+    def __init__(self, scope, argname):
+        self.scope = scope
+        self.argname = argname
+
+
+def test_fixture_times(monkeypatch):
+    monkeypatch.setattr(Timings, "fixtures", OrderedDict())
+    fixturedef = _FixtureDef("module", "device")
+    _add_fixture_time(fixturedef, "setup", 1.5)
+    _add_fixture_time(fixturedef, "setup", 0.5)
+    _add_fixture_time(fixturedef, "teardown", 0.25)
+    assert Timings.fixtures == {
+        ("module", "device", "setup"): [2, 2.0, 1.5],
+        ("module", "device", "teardown"): [1, 0.25, 0.25]}
+
+
+def test_step_times(monkeypatch):
+    monkeypatch.setattr(Timings, "steps", OrderedDict())
+    monkeypatch.setattr(Timings, "step", None)
+    monkeypatch.setattr(SessionStatus, "test_function", "test_one")
+    monkeypatch.setattr(SessionStatus, "phase", "call")
+    # Each step runs until the next step or the end of the phase
+    _start_step("First step", 10.0)
+    _start_step("Second step", 12.0)
+    _end_step(12.5)
+    _end_step(20.0)
+    monkeypatch.setattr(SessionStatus, "phase", "teardown")
+    _start_step("First step", 20.0)
+    _end_step(21.0)
+    assert Timings.steps == {("test_one", "call", "First step"): 2.0,
+                             ("test_one", "call", "Second step"): 0.5,
+                             ("test_one", "teardown", "First step"): 1.0}
+    assert Timings.step is None
+
+
+def test_record_timestamp_is_clock_time(monkeypatch):
+    monkeypatch.setattr(Timings, "start", 100.0)
+    result = _result("passed", "test_one")
+    result.timestamp = 2.5
+    record = _result_record(result)
+    assert record["timestamp"] == 102.5
+    # Read by a process whose session started at a different time
+    monkeypatch.setattr(Timings, "start", 101.0)
+    assert _result_from_record(record, []).timestamp == 1.5
+
+
+def test_summary_steps_not_timed(monkeypatch):
+    monkeypatch.setattr(Timings, "steps", OrderedDict())
+    monkeypatch.setattr(Timings, "step", None)
+    monkeypatch.setattr(Timings, "finished", True)
+    monkeypatch.setattr(SessionStatus, "test_function", "test_one")
+    monkeypatch.setattr(SessionStatus, "phase", "teardown")
+    _start_step("Saved results", 30.0)
+    _end_step(31.0)
+    assert Timings.steps == {}
@@ -0,0 +1,29 @@
+from array import array
+from pytest import log, verify_array
+
+
+def test_verify_array_usage():
+    log.high_level_step("Verify conditions over whole arrays")
+
+    log.detail_step("Test an array where every element passes")
+    samples = array("d", [0.1 * i for i in range(100)])
+    verify_array(samples, lambda x: x < 10, "samples are less than 10 (pass)")
+
+    log.detail_step("Test an array with failing elements")
+    samples[3] = 12.5
+    samples[7] = 10.5
+    verify_array(samples, lambda x: x < 10, "samples are less than 10 (fail)",
+                 raise_immediately=False)
+
+    log.detail_step("Test a buffer where elements pass the failure condition "
+                    "but some fail the warning condition")
+    capture = bytearray(range(200))
+    verify_array(capture, lambda x: x < 256, "bytes are valid",
+                 warn_condition=lambda x: x < 150,
+                 warn_message="bytes are less than 150 (warning)")
+
+    log.detail_step("Test an array with a failure saved as a warning")
+    verify_array(capture, lambda x: x != 100, "bytes are not 100 (warning)",
+                 warning=True)
+
+    log.detail_step("End of test_verify_array_usage")
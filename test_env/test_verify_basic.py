@@ -51,3 +51,15 @@ def test_verify_basic_usage():
            warn_message="test x is in a narrower range")
 
     log.detail_step("End of test_verify_basic_usage")
+
+
+def test_verify_lazy_messages():
+    log.high_level_step("Verify messages formatted when required")
+    x = 5
+    verify(x < 10, "Check x ({}) is less than {} (passes)", fail_args=(x, 10))
+    verify(x > 10, "Check x ({}) is greater than {} (fails)",
+           raise_immediately=False, fail_args=(x, 10))
+    verify(x < 10, lambda: "Check x ({}) is less than 10 (passes)".format(x),
+           warn_condition=x < 1,
+           warn_message=lambda: "Check x ({}) is less than 1 (warns)"
+           .format(x))
@@ -0,0 +1,53 @@
+import socket
+import threading
+from pytest import fixture, log, verify_concurrently
+
+
+@fixture
+def endpoints(request):
+    # Listening sockets that accept connections in a thread
+    servers = []
+    for _ in range(20):
+        server = socket.socket()
+        server.bind(("127.0.0.1", 0))
+        server.listen(5)
+        servers.append(server)
+
+    def accept(server):
+        while True:
+            try:
+                server.accept()[0].close()
+            except socket.error:
+                return
+    for server in servers:
+        thread = threading.Thread(target=accept, args=(server,))
+        thread.daemon = True
+        thread.start()
+
+    def teardown():
+        for server in servers:
+            server.close()
+    request.addfinalizer(teardown)
+    return [server.getsockname() for server in servers]
+
+
+def _connects(address):
+    def check():
+        connection = socket.create_connection(address, timeout=1)
+        connection.close()
+        return True
+    return check
+
+
+def test_verify_concurrently(endpoints):
+    log.high_level_step("Verify each endpoint accepts a connection")
+    verify_concurrently(dict(("{}:{}".format(*address), _connects(address))
+                             for address in endpoints),
+                        "Check endpoint accepts a connection",
+                        max_workers=8, timeout=5)
+    log.high_level_step("Verify a batch including a closed port (warning)")
+    verify_concurrently([_connects(endpoints[0]),
+                         _connects(("127.0.0.1", 1))],
+                        "Check endpoint accepts a connection",
+                        warning=True)
+    log.detail_step("End of test_verify_concurrently")
@@ -0,0 +1,28 @@
+from pytest import log, verify_each
+
+
+def test_verify_each_usage():
+    log.high_level_step("Verify predicates for each element of iterables")
+
+    log.detail_step("Test a generator where every element passes")
+    verify_each((i for i in range(1000)), lambda x: x < 1000,
+                "values are less than 1000 (pass)")
+
+    log.detail_step("Test a generator with failing elements")
+    lines = ("line {}{}".format(i, " ERROR" if i % 100 == 7 else "")
+             for i in range(1000))
+    verify_each(lines, lambda line: "ERROR" not in line,
+                "lines have no errors (fail)", raise_immediately=False)
+
+    log.detail_step("Test a generator that stops at the failure limit")
+    verify_each(iter(range(1000000)), lambda x: x % 2 == 0,
+                "values are even (fail, stops after 3 failures)",
+                raise_immediately=False, max_failures=3)
+
+    log.detail_step("Test elements that pass the predicate but some fail the "
+                    "warning predicate")
+    verify_each(range(200), lambda x: x < 256, "values are valid",
+                warn_predicate=lambda x: x < 150,
+                warn_message="values are less than 150 (warning)")
+
+    log.detail_step("End of test_verify_each_usage")
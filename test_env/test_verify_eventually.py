@@ -0,0 +1,14 @@
+import time
+from pytest import log, verify_eventually
+
+
+def test_verify_eventually():
+    log.high_level_step("Verify a condition that is met after 0.3s")
+    start = time.time()
+    verify_eventually(lambda: time.time() - start > 0.3,
+                      "Check the condition is eventually met", timeout=2,
+                      interval=0.05, backoff=2)
+    log.high_level_step("Verify a condition that is never met (warning)")
+    verify_eventually(lambda: False, "Check the condition is never met",
+                      timeout=0.2, warning=True)
+    log.detail_step("End of test_verify_eventually")
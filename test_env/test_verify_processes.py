@@ -0,0 +1,28 @@
+from multiprocessing import Pool
+from pytest import fixture, log, verify
+
+
+def _check_value(value):
+    verify(value < 100, "Check value {} is less than 100".format(value))
+    verify(value < 100, "Check value is less than 100",
+           warn_condition=value != 7,
+           warn_message="Check value is not 7 (warns in child process)")
+    return value
+
+
+@fixture
+def process_pool(request):
+    pool = Pool(4)
+    pool.map(_check_value, range(4))
+
+    def teardown():
+        pool.close()
+        pool.join()
+    request.addfinalizer(teardown)
+    return pool
+
+
+def test_verify_processes(process_pool):
+    log.high_level_step("Verify from a process pool")
+    process_pool.map(_check_value, range(10))
+    log.detail_step("End of test_verify_processes")
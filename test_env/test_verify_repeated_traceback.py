@@ -0,0 +1,18 @@
+from pytest import log, verify
+
+
+def test_repeated_traceback():
+    log.high_level_step("Repeated failures share a saved traceback")
+
+    log.detail_step("Fail the same verification in a loop (one traceback "
+                    "saved, occurred 5 times)")
+    for i in range(5):
+        verify(i > 10, "Check i is greater than 10 (fails)",
+               raise_immediately=False)
+
+    log.detail_step("Warn from a different line (separate traceback)")
+    for i in range(3):
+        verify(i < 10, "Check i is less than 10", warn_condition=i < 1,
+               warn_message="Check i is less than 1 (warns)")
+
+    log.detail_step("End of test_repeated_traceback")
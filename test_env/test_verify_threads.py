@@ -0,0 +1,29 @@
+from multiprocessing.pool import ThreadPool
+from pytest import fixture, log, verify, verify_context
+
+
+def _check_value(value):
+    verify(value < 100, "Check value {} is less than 100".format(value))
+    verify(value < 100, "Check value is less than 100",
+           warn_condition=value != 7,
+           warn_message="Check value is not 7 (warns in thread)")
+
+
+@fixture
+def thread_pool(request):
+    pool = ThreadPool(4)
+    context = verify_context()
+    pool.map(context.bind(_check_value), range(4))
+
+    def teardown():
+        pool.close()
+        pool.join()
+    request.addfinalizer(teardown)
+    return pool
+
+
+def test_verify_threads(thread_pool):
+    log.high_level_step("Verify from a thread pool")
+    context = verify_context()
+    thread_pool.map(context.bind(_check_value), range(10))
+    log.detail_step("End of test_verify_threads")
@@ -0,0 +1,30 @@
+import time
+from pytest import fixture, log, verify
+
+
+@fixture(scope="module")
+def slow_module_setup(request):
+    log.high_level_step("Slow module scope setup")
+    time.sleep(0.2)
+
+    def teardown():
+        log.high_level_step("Slow module scope teardown")
+        time.sleep(0.1)
+    request.addfinalizer(teardown)
+
+
+@fixture
+def slow_function_setup(slow_module_setup):
+    time.sleep(0.05)
+
+
+def test_verify_timings_1(slow_function_setup):
+    log.high_level_step("Slow step")
+    verify(True, "Check before sleeping")
+    time.sleep(0.1)
+    verify(True, "Check after sleeping")
+
+
+def test_verify_timings_2(slow_function_setup):
+    log.high_level_step("Fast step")
+    verify(True, "Check without sleeping")